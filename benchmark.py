@@ -0,0 +1,454 @@
+"""
+A benchmark of the auto field collectors of script.py, that runs without the hardware being audited.
+
+Every collector is run against a fixture tree (a copy of the files under /proc and /sys that the collectors read, either
+built synthetically or recorded on a real machine), with canned outputs for the Linux commands they fall back to.
+For each field, it reports the latency (median and maximum of several runs), the number of processes started, and the peak memory
+allocated by Python, and fails (exit code 1) if any of them is over its budget (see BUDGETS), or if a field has an unexpected value.
+
+Two scenarios are run:
+- native: the fixture tree is available, so the collectors should read it directly, without starting any process
+- fallback: there is no /proc nor /sys, so the collectors fall back to their Linux commands (see AUTO_FIELDS_LINUX_COMMANDS in script.py)
+"""
+
+import os
+import sys
+import glob
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import statistics
+import subprocess
+import time
+
+import script
+
+
+# Budgets of each field in each scenario: (median latency in milliseconds, number of processes started, peak memory in KiB)
+# NOTE: Latency budgets are generous on purpose, so that they hold on slow machines too; use --budget-scale to tighten or loosen them
+#       Process counts include the shell that runs a pipeline, and every command of the pipeline
+#       Collectors run in the order of EquipmentInfo.auto_fields, sharing the source cache, so WiFi reuses the `lspci` output of ethernet
+BUDGETS = {
+    "native": {
+        "model_name":           (2, 0, 64),
+        "RAM":                  (2, 0, 64),
+        "screen_size":          (5, 0, 64),
+        "battery_health":       (5, 0, 64),
+        "has_ethernet":         (10, 0, 128),
+        "has_wifi":             (10, 0, 128),
+        "has_optical_drive":    (5, 0, 64),
+        "has_touchscreen":      (5, 0, 64),
+    },
+    "fallback": {
+        "model_name":           (2, 0, 64),
+        "RAM":                  (2, 0, 64),
+        "screen_size":          (200, 3, 256),
+        "battery_health":       (200, 7, 256),
+        "has_ethernet":         (200, 4, 256),
+        "has_wifi":             (200, 2, 256),
+        "has_optical_drive":    (200, 4, 256),
+        "has_touchscreen":      (200, 4, 256),
+    },
+}
+
+# Values the collectors should find in the synthetic fixture tree (see make_synthetic_tree()) and canned command outputs (see CANNED_OUTPUTS)
+# NOTE: CPU model and RAM have no fallback, so they are empty in the fallback scenario
+EXPECTED_VALUES = {
+    "native": {
+        "model_name":           "Intel(R) Core(TM) i5-8350U CPU @ 1.70GHz",
+        "RAM":                  16,
+        "screen_size":          16,
+        "battery_health":       90.0,
+        "has_ethernet":         True,
+        "has_wifi":             True,
+        "has_optical_drive":    True,
+        "has_touchscreen":      True,
+    },
+    "fallback": {
+        "model_name":           None,
+        "RAM":                  None,
+        "screen_size":          16,
+        "battery_health":       87.54,
+        "has_ethernet":         True,
+        "has_wifi":             True,
+        "has_optical_drive":    True,
+        "has_touchscreen":      True,
+    },
+}
+
+# Canned outputs of the Linux commands the collectors fall back to, as recorded on a laptop with a 15.6" screen, ethernet, WiFi, a DVD drive and a touchscreen
+# Each command is replaced by a shell script printing its output; "upower" prints the first output with -e, and the second one with -i
+CANNED_OUTPUTS = {
+    "xrandr": "Screen 0: minimum 320 x 200, current 1920 x 1080, maximum 16384 x 16384\n"
+              "eDP-1 connected primary 1920x1080+0+0 (normal left inverted right x axis y axis) 344mm x 194mm\n"
+              "   1920x1080     60.02*+  60.01    59.97    59.96    59.93\n"
+              "HDMI-1 disconnected (normal left inverted right x axis y axis)\n",
+    "upower": ("/org/freedesktop/UPower/devices/line_power_AC\n"
+               "/org/freedesktop/UPower/devices/battery_BAT0\n"
+               "/org/freedesktop/UPower/devices/DisplayDevice\n",
+               "  native-path:          BAT0\n"
+               "  vendor:               SMP\n"
+               "  model:                01AV489\n"
+               "  power supply:         yes\n"
+               "  battery\n"
+               "    present:             yes\n"
+               "    state:               fully-charged\n"
+               "    energy:              45.1 Wh\n"
+               "    energy-full:         45.48 Wh\n"
+               "    energy-full-design:  51.95 Wh\n"
+               "    voltage:             12.9 V\n"
+               "    percentage:          99%\n"
+               "    capacity:            87.5432%\n"
+               "    technology:          lithium-polymer\n"),
+    "lspci": "00:00.0 Host bridge: Intel Corporation Xeon E3-1200 v6/7th Gen Core Processor Host Bridge/DRAM Registers (rev 08)\n"
+             "00:02.0 VGA compatible controller: Intel Corporation UHD Graphics 620 (rev 07)\n"
+             "00:14.0 USB controller: Intel Corporation Sunrise Point-LP USB 3.0 xHCI Controller (rev 21)\n"
+             "00:17.0 SATA controller: Intel Corporation Sunrise Point-LP SATA Controller [AHCI mode] (rev 21)\n"
+             "00:1f.6 Ethernet controller: Intel Corporation Ethernet Connection (4) I219-V (rev 21)\n"
+             "02:00.0 Network controller: Intel Corporation Wireless 8265 / 8275 (rev 78)\n",
+    "dmesg": "[    0.000000] Linux version 5.15.0-56-generic (buildd@lcy02-amd64-004)\n"
+             "[    1.902334] ata2.00: ATAPI: HL-DT-ST DVDRAM GUD1N, LD02, max UDMA/133\n"
+             "[    1.935116] sr 1:0:0:0: [sr0] scsi3-mmc drive: 24x/24x writer dvd-ram cd/rw xa/form2 cdda tray\n"
+             "[    1.935120] cdrom: Uniform CD-ROM driver Revision: 3.20\n",
+    "xinput": "Virtual core pointer                    \tid=2\t[master pointer  (3)]\n"
+              "   Virtual core XTEST pointer              \tid=4\t[slave  pointer  (2)]\n"
+              "   ELAN Touchscreen                        \tid=11\t[slave  pointer  (2)]\n"
+              "   SynPS/2 Synaptics TouchPad              \tid=13\t[slave  pointer  (2)]\n"
+              "Virtual core keyboard                   \tid=3\t[master keyboard (2)]\n"
+              "   AT Translated Set 2 keyboard            \tid=12\t[slave  keyboard (3)]\n",
+}
+
+# Files (glob patterns, relative to /) copied from this machine by --record; these are all the files the native readers of script.py read
+#   (including the disks read to fill in the storage size, see script.read_block_devices())
+# NOTE: Network adapters that are not on the PCI bus (found through symlinks in /sys/class/net) are not recorded
+RECORDED_FILES = [
+    "proc/cpuinfo",
+    "proc/meminfo",
+    "proc/bus/input/devices",
+    "proc/sys/dev/cdrom/info",
+    "sys/class/power_supply/*/type",
+    "sys/class/power_supply/*/scope",
+    "sys/class/power_supply/*/present",
+    "sys/class/power_supply/*/energy_full",
+    "sys/class/power_supply/*/energy_full_design",
+    "sys/class/power_supply/*/charge_full",
+    "sys/class/power_supply/*/charge_full_design",
+    "sys/class/power_supply/*/voltage_min_design",
+    "sys/class/drm/*/status",
+    "sys/class/drm/*/edid",
+    "sys/bus/pci/devices/*/class",
+    "sys/bus/pci/devices/*/vendor",
+    "sys/bus/pci/devices/*/device",
+    "sys/bus/scsi/devices/*/type",
+    "sys/block/*/size",
+    "sys/block/*/removable",
+    "sys/block/*/queue/rotational",
+    "sys/block/*/device/model",
+    "sys/block/*/device/name",
+    "sys/block/*/device/type",
+    "sys/block/*/dev",
+    "sys/block/*/*/dev",
+    "proc/self/mountinfo",
+    "sys/class/input/input*/name",
+    "sys/class/input/input*/properties",
+    "sys/class/input/input*/capabilities/key",
+    "sys/class/input/input*/capabilities/abs",
+]
+
+
+########
+# This function writes a file in the fixture tree (creating its parent directories), where content is a str or bytes
+########
+def write_fixture(root, path, content):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, "wb" if isinstance(content, bytes) else "w") as f:
+        f.write(content)
+
+########
+# This function builds an EDID blob of a display with the given physical size (in millimeters) and preferred resolution (see script.parse_edid())
+########
+def make_edid(width_mm, height_mm, width_px, height_px):
+    edid = bytearray(128)
+    edid[:8] = b"\x00\xff\xff\xff\xff\xff\xff\x00"
+    edid[21], edid[22] = width_mm // 10, height_mm // 10
+    dtd = bytearray(18)
+    dtd[0], dtd[1] = 0x3a, 0x38 # pixel clock (not 0, so this is the preferred timing)
+    dtd[2], dtd[4] = width_px & 0xff, (width_px >> 8) << 4
+    dtd[5], dtd[7] = height_px & 0xff, (height_px >> 8) << 4
+    dtd[12], dtd[13], dtd[14] = width_mm & 0xff, height_mm & 0xff, (width_mm >> 8) << 4 | height_mm >> 8
+    edid[54:72] = dtd
+    return bytes(edid)
+
+########
+# This function builds a synthetic fixture tree (with "proc" and "sys" subdirectories) in root, resembling a typical audited laptop:
+#   a 4-core/8-thread CPU, 16 GB of RAM, a 15.6" built-in panel and an external monitor, a battery at 90% of its design capacity and a wireless mouse,
+#   ethernet and WiFi adapters among ~20 PCI devices, an SSD and a DVD drive, and a keyboard, touchpad and touchscreen
+########
+def make_synthetic_tree(root):
+    cpu = ("vendor_id\t: GenuineIntel\ncpu family\t: 6\nmodel\t\t: 142\nmodel name\t: Intel(R) Core(TM) i5-8350U CPU @ 1.70GHz\n"
+           "stepping\t: 10\nmicrocode\t: 0xf0\ncpu MHz\t\t: 1900.000\ncache size\t: 6144 KB\n"
+           "flags\t\t: " + " ".join(f"flag{i}" for i in range(120)) + "\n"
+           "bugs\t\t: spectre_v1 spectre_v2 spec_store_bypass swapgs itlb_multihit srbds mmio_stale_data retbleed\n"
+           "bogomips\t: 3799.90\nclflush size\t: 64\ncache_alignment\t: 64\naddress sizes\t: 39 bits physical, 48 bits virtual\npower management:\n")
+    write_fixture(root, "proc/cpuinfo", "".join(f"processor\t: {i}\n{cpu}\n" for i in range(8)))
+    write_fixture(root, "proc/meminfo", "MemTotal:       16248580 kB\nMemFree:         9876543 kB\nMemAvailable:   12345678 kB\n"
+        + "".join(f"Field{i}:        {i * 1024} kB\n" for i in range(40)))
+
+    power_supply = "sys/class/power_supply"
+    write_fixture(root, f"{power_supply}/AC/type", "Mains\n")
+    write_fixture(root, f"{power_supply}/BAT0/type", "Battery\n")
+    write_fixture(root, f"{power_supply}/BAT0/present", "1\n")
+    write_fixture(root, f"{power_supply}/BAT0/energy_full", "45000000\n")
+    write_fixture(root, f"{power_supply}/BAT0/energy_full_design", "50000000\n")
+    write_fixture(root, f"{power_supply}/hidpp_battery_0/type", "Battery\n")
+    write_fixture(root, f"{power_supply}/hidpp_battery_0/scope", "Device\n")
+
+    write_fixture(root, "sys/class/drm/card0/dev", "226:0\n")
+    write_fixture(root, "sys/class/drm/card0-eDP-1/status", "connected\n")
+    write_fixture(root, "sys/class/drm/card0-eDP-1/edid", make_edid(344, 194, 1920, 1080))
+    write_fixture(root, "sys/class/drm/card0-HDMI-A-1/status", "connected\n")
+    write_fixture(root, "sys/class/drm/card0-HDMI-A-1/edid", make_edid(527, 296, 2560, 1440))
+    write_fixture(root, "sys/class/drm/card0-DP-1/status", "disconnected\n")
+
+    pci_classes = [0x060000, 0x030000, 0x118000, 0x0c0330, 0x050000, 0x078000, 0x010601, 0x060400, 0x060400, 0x060400,
+                   0x060100, 0x058000, 0x040300, 0x0c0500, 0x020000, 0x028000, 0x010802, 0x0c8000, 0x088000, 0x0c0340]
+    for i, pci_class in enumerate(pci_classes):
+        slot = f"sys/bus/pci/devices/0000:00:{i:02x}.0"
+        write_fixture(root, f"{slot}/class", f"0x{pci_class:06x}\n")
+        write_fixture(root, f"{slot}/vendor", "0x8086\n")
+        write_fixture(root, f"{slot}/device", f"0x{0x9d00 + i:04x}\n")
+    os.makedirs(os.path.join(root, "sys/class/net/lo"), exist_ok = True)
+
+    write_fixture(root, "sys/block/nvme0n1/size", "500118192\n")
+    write_fixture(root, "sys/block/nvme0n1/removable", "0\n")
+    write_fixture(root, "sys/block/nvme0n1/queue/rotational", "0\n")
+    write_fixture(root, "sys/block/nvme0n1/device/model", "SAMSUNG MZVLB256HAHQ-000L7\n")
+    write_fixture(root, "sys/block/sr0/size", "2097151\n")
+    write_fixture(root, "sys/block/sr0/removable", "1\n")
+    write_fixture(root, "sys/block/sr0/queue/rotational", "1\n")
+    write_fixture(root, "sys/block/sr0/device/model", "DVDRAM GUD1N\n")
+    for i in range(8):
+        write_fixture(root, f"sys/block/loop{i}/size", "0\n")
+    write_fixture(root, "sys/bus/scsi/devices/1:0:0:0/type", f"{script.SCSI_TYPE_ROM}\n")
+    write_fixture(root, "proc/sys/dev/cdrom/info", "CD-ROM information, Id: cdrom.c 3.20 2003/12/17\n\ndrive name:\t\tsr0\ndrive speed:\t\t24\n")
+
+    # capability bitmaps are written with one word per long, like the kernel does (see script.parse_input_bitmap())
+    def bitmap(*bits):
+        words = [0] * (max(bits) // script.BITS_PER_LONG + 1)
+        for bit in bits:
+            words[bit // script.BITS_PER_LONG] |= 1 << bit % script.BITS_PER_LONG
+        return " ".join(f"{word:x}" for word in reversed(words))
+    input_devices = [
+        ("AT Translated Set 2 keyboard", "0", bitmap(*range(1, 120)), "0"),
+        ("SynPS/2 Synaptics TouchPad", bitmap(script.INPUT_PROP_POINTER), bitmap(script.BTN_TOOL_FINGER, script.BTN_TOUCH),
+            bitmap(script.ABS_X, 1, script.ABS_MT_POSITION_X)),
+        ("ELAN Touchscreen", bitmap(script.INPUT_PROP_DIRECT), bitmap(script.BTN_TOUCH), bitmap(script.ABS_X, 1, script.ABS_MT_POSITION_X)),
+        ("Video Bus", "0", bitmap(224, 225, 241), "0"),
+        ("Power Button", "0", bitmap(116), "0"),
+    ]
+    blocks = []
+    for i, (name, props, keys, abs_axes) in enumerate(input_devices):
+        blocks.append(f'I: Bus=0011 Vendor=0001 Product=0001 Version=ab41\nN: Name="{name}"\nP: Phys=isa0060/serio{i}/input0\n'
+            f"S: Sysfs=/devices/platform/i8042/serio{i}/input/input{i}\nU: Uniq=\nH: Handlers=event{i}\n"
+            f"B: PROP={props}\nB: EV=b\nB: KEY={keys}\nB: ABS={abs_axes}\n")
+        write_fixture(root, f"sys/class/input/input{i}/name", name + "\n")
+        write_fixture(root, f"sys/class/input/input{i}/properties", props + "\n")
+        write_fixture(root, f"sys/class/input/input{i}/capabilities/key", keys + "\n")
+        write_fixture(root, f"sys/class/input/input{i}/capabilities/abs", abs_axes + "\n")
+    write_fixture(root, "proc/bus/input/devices", "\n".join(blocks) + "\n")
+
+########
+# This function records a fixture tree from this machine into root: it copies all the files in RECORDED_FILES that exist and can be read
+# Returns the number of files copied
+########
+def record_tree(root):
+    copied = 0
+    for pattern in RECORDED_FILES:
+        for path in glob.glob(os.path.join("/", pattern)):
+            try:
+                with open(path, "rb") as f:
+                    content = f.read()
+            except OSError:
+                continue
+            write_fixture(root, os.path.relpath(path, "/"), content)
+            copied += 1
+    return copied
+
+########
+# This function creates a directory of fake commands, to be put first in PATH while the fallback collectors run:
+#   - the commands in CANNED_OUTPUTS print their canned output
+#   - all other commands of AUTO_FIELDS_LINUX_COMMANDS (e.g. grep, awk) run the real command
+# Every command appends a line to exec_log when it's run, so the processes started can be counted
+########
+def make_fake_commands(bin_dir, exec_log):
+    os.makedirs(bin_dir, exist_ok = True)
+    commands = {stage.split()[0] for pipeline in script.AUTO_FIELDS_LINUX_COMMANDS.values() for stage in pipeline}
+    for command in commands:
+        if command in CANNED_OUTPUTS:
+            outputs = CANNED_OUTPUTS[command]
+            if isinstance(outputs, tuple): # upower: -e lists the devices, -i shows one of them
+                body = f'if [ "$1" = "-e" ]; then\ncat <<"EOF"\n{outputs[0]}EOF\nelse\ncat <<"EOF"\n{outputs[1]}EOF\nfi\n'
+            else:
+                body = f'cat <<"EOF"\n{outputs}EOF\n'
+        else:
+            real = shutil.which(command)
+            if real is None:
+                continue
+            body = f'exec {real} "$@"\n'
+        path = os.path.join(bin_dir, command)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\necho {command} >> "{exec_log}"\n{body}')
+        os.chmod(path, 0o755)
+
+########
+# This context manager points script.py to the given fixture tree, and puts the fake commands first in PATH, for the duration of the block
+# With tree None, /proc, /sys and the kernel log are pointed to paths that don't exist, so that the collectors fall back to their Linux commands
+########
+@contextlib.contextmanager
+def fixture_environment(tree, bin_dir):
+    missing = os.path.join(bin_dir, "does-not-exist")
+    saved = (script.PROC_ROOT, script.SYS_ROOT, script.KERNEL_LOG, os.environ["PATH"])
+    script.PROC_ROOT = os.path.join(tree, "proc") if tree else missing
+    script.SYS_ROOT = os.path.join(tree, "sys") if tree else missing
+    script.KERNEL_LOG = os.path.join(tree, "dev", "kmsg") if tree else missing
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ["PATH"]
+    try:
+        yield
+    finally:
+        script.PROC_ROOT, script.SYS_ROOT, script.KERNEL_LOG, os.environ["PATH"] = saved
+
+########
+# This class wraps subprocess.Popen to count the shells started by the collectors to run a pipeline
+# (commands are counted by the fake commands themselves, whether they're run by a shell or directly, see make_fake_commands())
+########
+class CountingPopen(subprocess.Popen):
+    started = 0
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get("shell"):
+            CountingPopen.started += 1
+        super().__init__(*args, **kwargs)
+
+########
+# This function builds a fresh EquipmentInfo, as if the script just started, without parsing arguments or running the audit
+# It comes with an empty source cache (see script.SourceCache), so that each run measures a cold collection
+########
+def new_equipment_info():
+    info = script.EquipmentInfo.__new__(script.EquipmentInfo)
+    info.reset_fields()
+    return info
+
+########
+# This function runs every collector repeat times in the current environment, one after the other in a single thread, and returns a dictionary
+#   mapping each field to {"value", "error", "median_ms", "max_ms", "processes", "peak_kib"}
+# Latency is measured first without tracing memory, since tracemalloc slows allocations down; memory is then measured in a separate run
+########
+def run_collectors(exec_log, repeat):
+    fields = new_equipment_info().auto_fields
+    results = {field: {"times": []} for field in fields}
+    saved_popen = subprocess.Popen
+    subprocess.Popen = CountingPopen
+    try:
+        for _ in range(repeat):
+            info = new_equipment_info()
+            for field in fields:
+                start = time.perf_counter()
+                value, error = getattr(info, f"_{field}_collector")()
+                results[field]["times"].append(time.perf_counter() - start)
+                results[field]["value"], results[field]["error"] = value, error
+
+        info = new_equipment_info()
+        for field in fields:
+            open(exec_log, "w").close()
+            CountingPopen.started = 0
+            tracemalloc.start()
+            getattr(info, f"_{field}_collector")()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(exec_log) as f:
+                results[field]["processes"] = CountingPopen.started + sum(1 for _ in f)
+            results[field]["peak_kib"] = peak / 1024
+    finally:
+        subprocess.Popen = saved_popen
+
+    for field in fields:
+        times = results[field].pop("times")
+        results[field]["median_ms"] = statistics.median(times) * 1000
+        results[field]["max_ms"] = max(times) * 1000
+    return results
+
+########
+# This function compares the results of a scenario with its budgets (and expected values, if given), prints a report,
+#   and returns the list of problems found (empty if everything is within budget)
+########
+def check_results(scenario, results, budget_scale, expected=None):
+    problems = []
+    print(f"\n{scenario}:")
+    print(f"  {'field':<20} {'median ms':>10} {'max ms':>9} {'processes':>10} {'peak KiB':>9}  value")
+    for field, result in results.items():
+        max_ms, max_processes, max_kib = BUDGETS[scenario][field]
+        over = []
+        if result["median_ms"] > max_ms * budget_scale:
+            over.append(f"median latency {result['median_ms']:.2f} ms > {max_ms * budget_scale:g} ms")
+        if result["processes"] > max_processes:
+            over.append(f"{result['processes']} processes started > {max_processes}")
+        if result["peak_kib"] > max_kib * budget_scale:
+            over.append(f"peak memory {result['peak_kib']:.1f} KiB > {max_kib * budget_scale:g} KiB")
+        if expected is not None and result["value"] != expected[field]:
+            over.append(f"value {result['value']!r} != expected {expected[field]!r}")
+
+        value = f"(error: {result['error']})" if result["error"] else repr(result["value"])
+        line = f"  {field:<20} {result['median_ms']:>10.3f} {result['max_ms']:>9.3f} {result['processes']:>10} {result['peak_kib']:>9.1f}  {value}"
+        print(f"\033[91m{line}\033[00m" if over else line)
+        problems.extend(f"{scenario}/{field}: {problem}" for problem in over)
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", metavar="DIR", help="run against this recorded fixture tree (see --record) instead of a synthetic one; values are then not checked")
+    parser.add_argument("--record", metavar="DIR", help="record a fixture tree from this machine into DIR, and exit")
+    parser.add_argument("--repeat", metavar="N", type=int, default=20, help="number of times each collector is run to measure its latency (default: 20)")
+    parser.add_argument("--budget-scale", metavar="FACTOR", type=float, default=1.0, help="multiply the latency and memory budgets by this factor (default: 1)")
+    parser.add_argument("--json", metavar="FILE", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.record:
+        print(f"{record_tree(args.record)} file(s) recorded in {args.record}")
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix = "hardware-info-benchmark-") as tmp:
+        tree = args.fixtures
+        if tree is None:
+            tree = os.path.join(tmp, "tree")
+            make_synthetic_tree(tree)
+        bin_dir = os.path.join(tmp, "bin")
+        exec_log = os.path.join(tmp, "exec.log")
+        make_fake_commands(bin_dir, exec_log)
+
+        all_results = dict()
+        problems = []
+        for scenario, scenario_tree in (("native", tree), ("fallback", None)):
+            with fixture_environment(scenario_tree, bin_dir):
+                all_results[scenario] = run_collectors(exec_log, args.repeat)
+            expected = EXPECTED_VALUES[scenario] if args.fixtures is None or scenario == "fallback" else None
+            problems.extend(check_results(scenario, all_results[scenario], args.budget_scale, expected))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(all_results, f, indent = 2, default = str)
+
+    print()
+    if problems:
+        print("\033[91mOver budget:\033[00m")
+        for problem in problems:
+            print(f"\033[91m - {problem}\033[00m")
+        return 1
+    print("\033[92mAll collectors are within budget\033[00m")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,262 @@
+import time
+_script_start = time.perf_counter()
+
 import os
 import sys
 import re
 import subprocess
+import shlex
+import signal
+import struct
 import argparse
-from simple_salesforce import Salesforce
-import PySimpleGUI as sg
+import atexit
+import contextlib
+import importlib
+import json
+import io
+import hashlib
+import fcntl
+import bisect
+import datetime
+import random
+import urllib.parse
+import concurrent.futures
+import threading
+
+# NOTE: simple_salesforce and PySimpleGUI are slow to import, so they are only imported when needed, with import_module() below:
+#       simple_salesforce when connecting to Salesforce, and PySimpleGUI when starting the GUI
+#       So are the standard library modules only used by some commands or steps: sqlite3 (the upload spool), http.server, ipaddress and urllib.request
+#       (the fleet collector), csv and tempfile (the import command), and email.utils (uploading only the changed fields)
+
+########
+# Startup profile
+# The time spent in each import and initialization step is recorded, and reported at exit when the script is run with --startup-profile
+########
+
+# List of all the recorded steps; each step is a tuple (name, start time, duration, number of modules imported), times in seconds since the script started
+_startup_steps = [("standard library imports", 0.0, time.perf_counter() - _script_start, len(sys.modules))]
+
+########
+# This context manager records the time spent in the block it wraps as a startup step with the given name
+########
+@contextlib.contextmanager
+def startup_step(name):
+    modules_before = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _startup_steps.append((name, start - _script_start, end - start, len(sys.modules) - modules_before))
+
+########
+# This function records a point in time (e.g. when the first prompt is shown) as a startup step with no duration
+########
+def startup_mark(name):
+    _startup_steps.append((name, time.perf_counter() - _script_start, 0.0, 0))
+
+########
+# This function imports a module by its name and returns it, recording the time spent as a startup step
+########
+def import_module(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    with startup_step(f"import {name}"):
+        return importlib.import_module(name)
+
+########
+# This function prints the startup profile: one line per recorded step, sorted by start time
+########
+def print_startup_profile():
+    print("\nStartup profile (seconds since the script started):", file = sys.stderr)
+    print(f"  {'step':<40} {'start':>8} {'duration':>9} {'modules':>8}", file = sys.stderr)
+    for name, start, duration, modules in sorted(_startup_steps, key = lambda step: step[1]):
+        print(f"  {name:<40} {start:>8.3f} {duration:>9.3f} {modules:>8}", file = sys.stderr)
+
+########
+# Tracing
+# When the script is run with --profile FILE, the time spent in each stage, Salesforce call, CRID lookup, collector and Linux command is recorded
+#   as a span, and all spans are written to FILE at exit, in the Trace Event format that Chrome (chrome://tracing) and Perfetto (ui.perfetto.dev) can load
+# When tracing is off, trace_span() returns a shared span that does nothing, so spans cost next to nothing
+########
+
+# List of all the recorded spans (as trace events), or None when tracing is off
+_trace_events = None
+_trace_lock = threading.Lock()
+
+# Names of the threads spans were recorded on, keyed by thread id, so that the trace viewer can label them
+_trace_thread_names = dict()
+
+########
+# This class is a span: the time spent in the block it wraps (with trace_span()) is recorded as a "complete" trace event
+# Details that are only known inside the block (e.g. the exit code of a command) can be added to the event with set()
+########
+class TraceSpan():
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args["exception"] = f"{exc_type.__name__}: {exc_value}"
+        thread = threading.current_thread()
+        event = {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": (self.start - _script_start) * 1e6, # microseconds since the script started
+            "dur": (end - self.start) * 1e6,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": {name: value if isinstance(value, (int, float, bool, type(None))) else str(value) for name, value in self.args.items()},
+        }
+        with _trace_lock:
+            if _trace_events is not None:
+                _trace_events.append(event)
+                _trace_thread_names[thread.ident] = thread.name
+        return False
+
+########
+# This class is the span returned by trace_span() when tracing is off; it records nothing
+########
+class _NoTraceSpan():
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NO_TRACE_SPAN = _NoTraceSpan()
+
+########
+# This function returns a span (a context manager) that records the time spent in the block it wraps, under the given name and category
+#   (e.g. "salesforce", "collector", "subprocess"); args are details shown with the span in the trace viewer, e.g.
+#   with trace_span("CRID lookup", "salesforce", crid = cr) as span:
+#       ...
+#       span.set(found = True)
+########
+def trace_span(name, category, **args):
+    if _trace_events is None:
+        return _NO_TRACE_SPAN
+    return TraceSpan(name, category, args)
+
+########
+# This function turns tracing on; spans are recorded from then on
+########
+def start_tracing():
+    global _trace_events
+    with _trace_lock:
+        if _trace_events is None:
+            _trace_events = []
+
+########
+# This function writes all the spans recorded so far to a file, as a JSON trace that Chrome's trace viewer and Perfetto can load
+########
+def write_trace(path):
+    with _trace_lock:
+        events = list(_trace_events or [])
+        thread_names = dict(_trace_thread_names)
+    pid = os.getpid()
+    metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "hardware-info-script"}}]
+    metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}} for tid, name in thread_names.items()]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+    print(f"Trace written to {path} (open it in chrome://tracing or https://ui.perfetto.dev)", file = sys.stderr)
+
+########
+# Deadline of the Linux commands run by the current thread (see command_deadline()), so that a hung command (e.g. `xrandr` with no display,
+#   or `upower` with D-Bus stuck) cannot make a collector run past its time
+########
+_command_deadline = threading.local()
+
+########
+# This context manager sets the deadline (a time.monotonic() value) by which the Linux commands run by the current thread in the block must finish
+########
+@contextlib.contextmanager
+def command_deadline(deadline):
+    previous = getattr(_command_deadline, "value", None)
+    _command_deadline.value = deadline
+    try:
+        yield
+    finally:
+        _command_deadline.value = previous
+
+########
+# This function runs a command (a list of arguments, or a str with shell=True), and returns a subprocess.CompletedProcess with its output (bytes)
+# The command runs in its own process group (a new session), so that if it runs past the deadline of the current thread (see command_deadline()),
+#   it's killed along with every process it started (e.g. all the commands of a pipeline)
+# NOTE: Raises subprocess.TimeoutExpired if the command was killed, and FileNotFoundError if it doesn't exist (without shell=True)
+########
+def run_process(args, shell=False, input=None, stderr=None):
+    deadline = getattr(_command_deadline, "value", None)
+    process = subprocess.Popen(args, shell = shell, start_new_session = True, stdin = subprocess.PIPE if input is not None else None,
+                               stdout = subprocess.PIPE, stderr = stderr)
+    try:
+        stdout, errors = process.communicate(input, timeout = None if deadline is None else max(0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired as e:
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        raise subprocess.TimeoutExpired(args, e.timeout) from None
+    return subprocess.CompletedProcess(args, process.returncode, stdout, errors)
+
+########
+# This function runs a shell command (or pipeline), and returns its standard output (str); the command is traced as a span,
+#   with its exit code and the number of bytes read from it
+# stderr is passed to subprocess (e.g. subprocess.PIPE to keep error messages in the exception rather than printing them)
+# NOTE: Raises subprocess.CalledProcessError if the command fails; its output and stderr are str too
+#       Raises subprocess.TimeoutExpired if it runs past the deadline of the current thread (see run_process())
+########
+def run_shell(command, stderr=None):
+    with trace_span("subprocess", "subprocess", command = command) as span:
+        try:
+            result = run_process(command, shell = True, stderr = stderr)
+        except subprocess.TimeoutExpired:
+            span.set(timed_out = True)
+            raise
+        span.set(exit_code = result.returncode, bytes_read = len(result.stdout) + len(result.stderr or b""))
+        output = result.stdout.decode(errors = "replace")
+        if result.returncode:
+            raise subprocess.CalledProcessError(result.returncode, command, output, result.stderr.decode(errors = "replace") if result.stderr is not None else None)
+        return output
+
+########
+# This function passes a text (str) through a pipeline of filter commands (e.g. `grep`, `awk`), and returns the output of the last one (str)
+# Since the text is already in memory, the commands are run one after the other, directly (without a shell); each is traced like in run_shell()
+# NOTE: Raises subprocess.CalledProcessError if the last command fails (as in a shell pipeline, only its exit status counts);
+#       its stderr holds the error messages of all the commands
+#       Raises subprocess.TimeoutExpired if a command runs past the deadline of the current thread (see run_process())
+########
+def run_filters(commands, text):
+    errors = ""
+    for command in commands:
+        with trace_span("subprocess", "subprocess", command = command) as span:
+            try:
+                result = run_process(shlex.split(command), input = text.encode(), stderr = subprocess.PIPE)
+            except FileNotFoundError:
+                result = subprocess.CompletedProcess(command, 127, b"", f"{command.split()[0]}: not found\n".encode())
+            except subprocess.TimeoutExpired:
+                span.set(timed_out = True)
+                raise
+            span.set(exit_code = result.returncode, bytes_read = len(result.stdout) + len(result.stderr))
+        text = result.stdout.decode(errors = "replace")
+        errors += result.stderr.decode(errors = "replace")
+    if result.returncode:
+        raise subprocess.CalledProcessError(result.returncode, (" | ").join(commands), text, errors)
+    return text
+
 
 description = """
 A script that collects and parses hardware details and upload them to Salesforce.
@@ -49,25 +301,1556 @@ ALL_FIELDS_API_NAMES = {
     "has_touchscreen":      "TouchScreen_Works__c",
 }
 
+# Exit codes of the unattended mode (--manifest / --set)
+EXIT_UPLOADED = 0        # data uploaded to Salesforce
+EXIT_ERROR = 1           # could not log in, or Salesforce rejected the data
+EXIT_INVALID = 2         # invalid manifest or field values, or no record with the given CRID
+EXIT_QUEUED = 3          # Salesforce cannot be reached; data is saved in the upload spool and will be uploaded later
+
 # Configurations for some manual fields for convenience
 FINAL_OS_OPTIONS = ["20.04_Xubuntu_Linux"] # Salesforce API Name of all final OS options
 VIDEO_PORT_OPTIONS = ["VGA", "DVI", "HDMI", "Mini-HDMI", "Display Port", "Mini-Display"] # Salesforce API Name of all video ports options
 
+# Directory where the script keeps its local files, such as the cached Salesforce session
+CACHE_DIR = os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "hardware-info-script")
+
+# How long (in seconds) a cached Salesforce session is reused before logging in again; should not be longer than the org's session timeout
+# NOTE: A session that expires earlier (e.g. when the password is changed) is detected on the first failed call, and the script logs in again then
+SALESFORCE_SESSION_TTL = 2 * 60 * 60
+
+# Configurations for the HTTP connection to Salesforce (see SalesforceHttp)
+SALESFORCE_CONNECT_TIMEOUT = 5      # seconds to wait for a connection to Salesforce
+SALESFORCE_READ_TIMEOUT = 60        # seconds to wait for Salesforce to answer (e.g. a large page of a query)
+SALESFORCE_POOL_SIZE = 8            # number of connections to Salesforce kept alive, shared by all threads
+SALESFORCE_MAX_ATTEMPTS = 3         # number of attempts of an idempotent request that fails with a connection error, a timeout, or a transient status
+SALESFORCE_RETRY_BUDGET = 10        # number of retries allowed per run, across all requests, so that a Salesforce outage cannot stretch a run indefinitely
+SALESFORCE_RETRY_DELAY = 0.5        # maximum seconds to wait before the first retry (the actual delay is random); doubles for each retry
+SALESFORCE_RETRY_STATUSES = (429, 500, 502, 503, 504)
+SALESFORCE_IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+SALESFORCE_API_USAGE_WARNING = 0.9  # fraction of the daily API request limit of the organization above which a warning is printed
+
+# Pattern of the API usage in the Sforce-Limit-Info header of Salesforce responses, e.g. "api-usage=18/15000"
+SALESFORCE_API_USAGE_PATTERN = re.compile(r"(?:^|[^-])api-usage=(\d+)/(\d+)")
+
+# Maximum number of similar CRIDs suggested when an entered CRID is not found
+CRID_SUGGESTIONS = 5
+
+# Configurations for the upload spool (see UploadSpool)
+SPOOL_BATCH_SIZE = 200              # maximum number of records sent in one request (the limit of Salesforce's sObject Collections API)
+SPOOL_MAX_ATTEMPTS = 10             # number of failed attempts after which a record is given up on
+SPOOL_BACKOFF = 30                  # seconds to wait before retrying a record after its first failed attempt; doubles after each attempt
+SPOOL_MAX_BACKOFF = 60 * 60         # maximum number of seconds to wait before retrying a record
+SPOOL_KEEP_SENT = 30 * 24 * 60 * 60 # number of seconds records are kept in the spool after they are sent
+
+# Maximum number of subrequests in one request to Salesforce's Composite API (used for updates guarded by If-Unmodified-Since)
+COMPOSITE_MAX_SUBREQUESTS = 25
+
+# Configurations for importing saved audit results with Salesforce's Bulk API 2.0 (see the "import" command)
+BULK_CHUNK_ROWS = 10000             # maximum number of records in one ingest job
+BULK_CHUNK_BYTES = 100 * 1000 * 1000 # maximum size of the CSV data of one ingest job (Salesforce accepts up to 150 MB)
+BULK_POLL_INTERVAL = 2              # seconds to wait before checking the state of an ingest job again; doubles each time, up to BULK_MAX_POLL_INTERVAL
+BULK_MAX_POLL_INTERVAL = 30
+BULK_FAILURES_FILE = "import-failures.csv" # default file the records that could not be imported are written to
+
+# Configurations for collecting the auto fields (see start_collection() and collect_auto_fields())
+AUTO_FIELD_TIMEOUT = 10             # seconds a collector may run; after that, its field is given up on, and the Linux commands it runs are killed
+AUTO_FIELDS_DEADLINE = 30           # seconds after the collection starts by which all the auto fields must be collected; the rest are given up on
+AUTO_FIELDS_WORKERS = 4             # number of collectors run at the same time; the ones that took the least time in earlier runs are started first
+AUTO_FIELD_COST_WEIGHT = 0.3        # weight of the latest run in the running average of the time each collector takes (see save_collector_costs())
+
+# Configurations for the fleet collector (see the "serve" command and --collector)
+COLLECTOR_ADDRESS = "0.0.0.0:8765"  # default address the collector listens on
+COLLECTOR_FLUSH_INTERVAL = 60       # default number of seconds between two flushes of the collector's spool to Salesforce
+COLLECTOR_TIMEOUT = 10              # number of seconds clients wait for the collector to answer
+COLLECTOR_MAX_BODY = 1024 * 1024    # maximum size (in bytes) of the records posted to the collector in one request
+
 # Linux commands used to automatically collect a field
+# NOTE: CPU model and RAM are read directly from /proc by the native readers below, so they have no Linux commands
+#       Ethernet and WiFi are looked up in the PCI device index below, battery health is read from /sys/class/power_supply,
+#       screen size is read from the EDID of the display, optical drives are found in /sys/block, and touchscreens in /proc/bus/input/devices;
+#       their commands are only run as a fallback if /sys and /proc are not available
 AUTO_FIELDS_LINUX_COMMANDS = {
-    "model_name":           ["cat /proc/cpuinfo", "grep 'model name'"],
-    "RAM":                  ["cat /proc/meminfo", "numfmt --field 2 --from-unit=Ki --to-unit=Gi", "sed 's/ kB/G/g'", "grep 'MemTotal'", "awk '{print $2}'"],
     "screen_size":          ["xrandr --current", "grep ' connected'"],
     "battery_health":       ["upower -i `upower -e | grep 'BAT'`", "grep 'capacity'", "awk '{print $2}'", "grep ."],
     "has_ethernet":         ["lspci", "grep 'ethernet' -i", "grep ."],
     "has_wifi":             ["lspci", "grep 'network|wireless' -i -E", "grep ."],
-    "has_optical_drive":    ["dmesg", "grep 'cdrom|cd-rom|dvd' -i -E", "grep ."],
+    "has_optical_drive":    ["dmesg", "grep 'cdrom|cd-rom|dvd' -i -E -m 1", "grep ."],
     "has_touchscreen":      ["xinput list", "grep 'touchscreen' -i", "grep ."],
 }
 
+# Root directories of the proc and sys file systems; all native readers below build their paths from them
+PROC_ROOT = "/proc"
+SYS_ROOT = "/sys"
+
+# Units supported by read_mem_total(), as multiples of KiB (the unit used in /proc/meminfo)
+MEMORY_UNITS = {"Ki": 1, "Mi": 1024, "Gi": 1024 * 1024}
+
+# PCI device classes (class and subclass, the first 4 hex digits of /sys/bus/pci/devices/*/class) of the devices we look for
+PCI_CLASS_ETHERNET = 0x0200         # Ethernet controller
+PCI_CLASS_NETWORK_OTHER = 0x0280    # Network controller (how most WiFi cards are listed)
+PCI_CLASS_WIRELESS_80211A = 0x0d20  # Wireless controller: 802.11a
+PCI_CLASS_WIRELESS_80211B = 0x0d21  # Wireless controller: 802.11b
+PCI_CLASSES_WIFI = (PCI_CLASS_NETWORK_OTHER, PCI_CLASS_WIRELESS_80211A, PCI_CLASS_WIRELESS_80211B)
+
+# Display connector types (as named in /sys/class/drm) that are used for built-in laptop panels
+INTERNAL_CONNECTOR_TYPES = ("eDP", "LVDS", "DSI")
+
+# SCSI peripheral type of CD/DVD drives (as found in /sys/bus/scsi/devices/*/type)
+SCSI_TYPE_ROM = 5
+
+# Block devices (as named in /sys/block) that are not disks of this machine: loop devices, compressed RAM (zram), RAM disks, optical drives, floppies,
+#   and device mapper and software RAID devices, whose space is already counted on the disks they're built from
+STORAGE_IGNORED_DEVICES = ("loop", "zram", "ram", "sr", "fd", "dm-", "md")
+
+# Unit of /sys/block/*/size, in bytes (always 512, whatever the sector size of the disk)
+SYSFS_SECTOR_SIZE = 512
+
+# Mount points of the boot medium of live systems (Ubuntu, Debian, Fedora); the disk mounted there is the boot USB, not a disk of this machine
+LIVE_MEDIUM_MOUNT_POINTS = ("/cdrom", "/run/live/medium", "/lib/live/mount/medium", "/run/initramfs/live", "/isodevice")
+
+# Columns of the table of disks shown when entering the storage size (see disk_table_row())
+DISK_TABLE_HEADINGS = ["Disk", "Size", "Type", "Model", "Counted"]
+
+# Kernel log device, and the pattern of kernel log lines that show an optical drive exists
+KERNEL_LOG = "/dev/kmsg"
+OPTICAL_DRIVE_LOG_PATTERN = re.compile(r"cdrom|cd-rom|dvd", re.IGNORECASE)
+
+# Input device capability bits (see linux/input-event-codes.h) used to tell touchscreens, touchpads and pens apart
+INPUT_PROP_POINTER = 0x00
+INPUT_PROP_DIRECT = 0x01
+ABS_X = 0x00
+ABS_MT_POSITION_X = 0x35
+BTN_TOOL_PEN = 0x140
+BTN_TOOL_FINGER = 0x145
+BTN_TOUCH = 0x14a
+
+# Number of bits in each word of the capability bitmaps in /proc/bus/input/devices (the size of a C long)
+BITS_PER_LONG = struct.calcsize("l") * 8
+
+# Files that identify this machine (the first one that can be read is used) for the field cache (see machine_fingerprint()); paths are relative to SYS_ROOT
+# NOTE: DMI ids are usually only readable by root; /etc/machine-id (which identifies the installed system rather than the hardware) is used otherwise
+MACHINE_ID_FILES = [os.path.join("class", "dmi", "id", "product_uuid"), os.path.join("class", "dmi", "id", "board_serial")]
+MACHINE_ID_FALLBACK = "/etc/machine-id"
+
+# Sources of the auto fields that can change without rebooting (a battery swapped, a display or a USB device plugged in), as a tuple
+#   (directory relative to SYS_ROOT, attribute files read in each of its entries); a cached field is collected again when its source changes
+# NOTE: Fields not listed here (e.g. CPU model and RAM) cannot change until the machine is rebooted
+AUTO_FIELDS_HOTPLUG_SOURCES = {
+    "screen_size":          (os.path.join("class", "drm"), ("status", "edid")),
+    "battery_health":       (os.path.join("class", "power_supply"), ("type", "model_name", "serial_number", "energy_full_design", "charge_full_design")),
+    "has_ethernet":         (os.path.join("class", "net"), ("address",)),
+    "has_wifi":             (os.path.join("class", "net"), ("address",)),
+    "has_optical_drive":    ("block", ()),
+    "has_touchscreen":      (os.path.join("class", "input"), ("name",)),
+}
+
+
+########
+# Native readers for /proc files
+# These read the files directly in Python instead of running `cat | grep | awk ...` pipelines, so no extra processes are started
+########
+
+########
+# This function reads a "key: value" file (such as /proc/cpuinfo or /proc/meminfo) line by line, and returns the value (str) of the first line with the given key
+# It stops reading as soon as the key is found, and returns None if the key is not in the file
+# NOTE: Raises OSError if the file cannot be read
+########
+def read_proc_value(path, key):
+    with open(path) as f:
+        for line in f:
+            name, sep, value = line.partition(":")
+            if sep and name.strip() == key:
+                return value.strip()
+    return None
+
+########
+# This function returns the CPU model name (str) from /proc/cpuinfo, or None if it's not listed
+########
+def read_cpu_model():
+    return read_proc_value(os.path.join(PROC_ROOT, "cpuinfo"), "model name")
+
+########
+# This function returns the total RAM (int) from /proc/meminfo in the given unit ("Ki", "Mi" or "Gi"), or None if it's not listed
+# NOTE: The size is rounded up, the same way `numfmt --from-unit=Ki --to-unit=Gi` does it
+#       Raises ValueError if the value is not in the expected "<number> kB" format
+########
+def read_mem_total(unit="Gi"):
+    value = read_proc_value(os.path.join(PROC_ROOT, "meminfo"), "MemTotal")
+    if value is None:
+        return None
+    r = re.fullmatch(r"(\d+)\s*kB", value)
+    if not r:
+        raise ValueError(f"unexpected MemTotal value {value!r}")
+    return -(-int(r.group(1)) // MEMORY_UNITS[unit])
+
+
+########
+# This function reads a small sysfs attribute file and returns its content (str) without the trailing newline, or None if it cannot be read
+########
+def read_sys_attr(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+########
+# This function reads a sysfs attribute file that holds an integer, and returns it (int), or None if it cannot be read
+########
+def read_sys_int(path):
+    value = read_sys_attr(path)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+########
+# This function returns a list of all the batteries of this machine found in /sys/class/power_supply
+# Each battery is a dictionary with the following keys:
+#   - "name": name of the battery (e.g. "BAT0")
+#   - "full": energy (in uWh) the battery can hold now, or None if unknown
+#   - "design": energy (in uWh) the battery is designed to hold, or None if unknown
+#   - "unit": unit of "full" and "design", "uWh" or "uAh"
+# NOTE: Some batteries report charge (in uAh) instead of energy, which is then converted using the battery's design voltage if it's known,
+#       and otherwise left in uAh
+#       Batteries of peripherals (e.g. a wireless mouse) are ignored
+#       Raises OSError if /sys/class/power_supply is not available
+########
+def read_batteries():
+    batteries = []
+    power_supply = os.path.join(SYS_ROOT, "class", "power_supply")
+    for name in sorted(os.listdir(power_supply)):
+        path = os.path.join(power_supply, name)
+        if read_sys_attr(os.path.join(path, "type")) != "Battery":
+            continue
+        if read_sys_attr(os.path.join(path, "scope")) == "Device" or read_sys_attr(os.path.join(path, "present")) == "0":
+            continue
+        full = read_sys_int(os.path.join(path, "energy_full"))
+        design = read_sys_int(os.path.join(path, "energy_full_design"))
+        unit = "uWh"
+        if full is None or design is None:
+            full = read_sys_int(os.path.join(path, "charge_full"))
+            design = read_sys_int(os.path.join(path, "charge_full_design"))
+            voltage = read_sys_int(os.path.join(path, "voltage_min_design")) # uV
+            if full is not None and design is not None and voltage:
+                full = full * voltage // 1000000
+                design = design * voltage // 1000000
+            else:
+                unit = "uAh"
+        batteries.append({"name": name, "full": full, "design": design, "unit": unit})
+    return batteries
+
+########
+# This function computes battery health (%), i.e. how much energy the batteries can hold now compared to when they were new, rounded to 2 decimals
+# With several batteries, the health is that of all of them combined; returns None if no battery reports its capacity
+# NOTE: Capacities in uWh and in uAh can't be added up, so if the batteries report different units, the health of each battery is averaged instead
+########
+def battery_health(batteries):
+    known = [b for b in batteries if b["full"] is not None and b["design"]]
+    if not known:
+        return None
+    if len(set(b["unit"] for b in known)) > 1:
+        return round(100 * sum(b["full"] / b["design"] for b in known) / len(known), 2)
+    return round(100 * sum(b["full"] for b in known) / sum(b["design"] for b in known), 2)
+
+
+########
+# This function parses an EDID blob (the data a display reports about itself, as found in /sys/class/drm/*/edid), and returns a dictionary:
+#   - "width_mm", "height_mm": physical size of the picture (int, in millimeters)
+#   - "preferred_mode": preferred resolution (width, height) in pixels, or None if not listed
+# The size is taken from the preferred timing descriptor (in mm) if it's there, otherwise from the basic display parameters (in cm)
+# NOTE: Raises ValueError if the blob is not a valid EDID
+########
+def parse_edid(blob):
+    if len(blob) < 128 or blob[:8] != b"\x00\xff\xff\xff\xff\xff\xff\x00":
+        raise ValueError("not an EDID blob")
+    width_mm = blob[21] * 10
+    height_mm = blob[22] * 10
+    preferred_mode = None
+
+    # the first 18-byte descriptor (at byte 54) is the preferred timing if its pixel clock is not 0
+    dtd = blob[54:72]
+    if dtd[0] or dtd[1]:
+        preferred_mode = (dtd[2] | ((dtd[4] & 0xf0) << 4), dtd[5] | ((dtd[7] & 0xf0) << 4))
+        dtd_width_mm = dtd[12] | ((dtd[14] & 0xf0) << 4)
+        dtd_height_mm = dtd[13] | ((dtd[14] & 0x0f) << 8)
+        if dtd_width_mm and dtd_height_mm:
+            width_mm, height_mm = dtd_width_mm, dtd_height_mm
+
+    return {"width_mm": width_mm, "height_mm": height_mm, "preferred_mode": preferred_mode}
+
+########
+# This function returns a list of all the connected displays found in /sys/class/drm, built-in panels first
+# Each display is a dictionary with the keys of parse_edid(), plus:
+#   - "connector": name of the connector (e.g. "eDP-1", "HDMI-A-1")
+#   - "internal": whether it's a built-in panel (bool)
+# NOTE: Displays without a (valid) EDID are skipped
+#       Raises OSError if /sys/class/drm is not available
+########
+def read_displays():
+    displays = []
+    drm = os.path.join(SYS_ROOT, "class", "drm")
+    for name in sorted(os.listdir(drm)):
+        path = os.path.join(drm, name)
+        if not name.startswith("card") or "-" not in name: # e.g. card0, renderD128 are not connectors
+            continue
+        if read_sys_attr(os.path.join(path, "status")) != "connected":
+            continue
+        try:
+            with open(os.path.join(path, "edid"), "rb") as f:
+                edid = parse_edid(f.read())
+        except (OSError, ValueError):
+            continue
+        connector = name.split("-", 1)[1]
+        displays.append(dict(edid, connector = connector, internal = connector.rsplit("-", 1)[0] in INTERNAL_CONNECTOR_TYPES))
+    displays.sort(key = lambda d: not d["internal"])
+    return displays
+
+########
+# This function computes the screen size, i.e. the length of the diagonal in inches (int), from the width and height in millimeters
+########
+def screen_diagonal(width_mm, height_mm):
+    return round((width_mm * width_mm + height_mm * height_mm) ** 0.5 / 25.4)
+
+
+########
+# This function checks whether this machine has an optical (CD/DVD) drive, by looking at:
+#   - /sys/block/sr*: block devices of optical drives
+#   - /proc/sys/dev/cdrom/info: drives registered with the CD-ROM driver
+#   - /sys/bus/scsi/devices/*/type: SCSI (incl. SATA and USB) devices of type ROM
+# Returns True or False, or None if none of them can be read (i.e. there is no way to tell from /sys and /proc)
+########
+def has_optical_drive():
+    readable = False
+    try:
+        if any(name.startswith("sr") for name in os.listdir(os.path.join(SYS_ROOT, "block"))):
+            return True
+        readable = True
+    except OSError:
+        pass
+
+    try:
+        drive_names = read_proc_value(os.path.join(PROC_ROOT, "sys", "dev", "cdrom", "info"), "drive name")
+        if drive_names:
+            return True
+        readable = True
+    except OSError:
+        pass
+
+    scsi_devices = os.path.join(SYS_ROOT, "bus", "scsi", "devices")
+    try:
+        for name in os.listdir(scsi_devices):
+            if read_sys_int(os.path.join(scsi_devices, name, "type")) == SCSI_TYPE_ROM:
+                return True
+        readable = True
+    except OSError:
+        pass
+
+    return False if readable else None
+
+########
+# This function searches the kernel log for a line matching the given pattern (compiled regex), and returns True if one is found, False otherwise
+# The log is read one record at a time from /dev/kmsg, stopping at the first match, so memory use does not depend on the size of the log
+# NOTE: Raises OSError if the kernel log cannot be read (e.g. when it's restricted to root by kernel.dmesg_restrict)
+########
+def kernel_log_search(pattern):
+    fd = os.open(KERNEL_LOG, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        while True:
+            try:
+                record = os.read(fd, 8192)
+            except BlockingIOError: # reached the end of the log
+                return False
+            except BrokenPipeError: # the record was overwritten while reading; continue with the next one
+                continue
+            if not record:
+                return False
+            if pattern.search(record.decode(errors = "replace")):
+                return True
+    finally:
+        os.close(fd)
+
+
+########
+# This function returns the device numbers ("major:minor", as in /sys/block/*/dev) of the file systems mounted on any of the given mount points,
+#   read from /proc/self/mountinfo
+# NOTE: Raises OSError if /proc/self/mountinfo cannot be read
+########
+def read_mount_devices(mount_points):
+    devices = set()
+    with open(os.path.join(PROC_ROOT, "self", "mountinfo")) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) > 4 and parts[4] in mount_points:
+                devices.add(parts[2])
+    return devices
+
+########
+# This function returns a list of the disks of this machine found in /sys/block, without running any command (unlike `lsblk`)
+# Each disk is a dictionary with the following keys:
+#   - "name": name of the disk (e.g. "nvme0n1", "sda", "mmcblk0", "vda")
+#   - "size_gb": size of the disk in (decimal) GB, the unit disks are sold in
+#   - "model": model of the disk, or None if unknown (e.g. virtio disks)
+#   - "rotational": whether it's a hard disk (as opposed to an SSD, NVMe or eMMC)
+#   - "removable": whether it's removable media (e.g. a card reader, or an SD card)
+#   - "usb": whether it's plugged in through USB
+#   - "boot": whether it's the boot medium of the live system being run (see LIVE_MEDIUM_MOUNT_POINTS)
+#   - "internal": whether it counts towards the storage of this machine, i.e. it's none of removable, USB and boot
+# NOTE: Devices listed in STORAGE_IGNORED_DEVICES and empty devices (e.g. a card reader with no card) are left out
+#       Raises OSError if /sys/block is not available
+########
+def read_block_devices():
+    block = os.path.join(SYS_ROOT, "block")
+    names = sorted(os.listdir(block))
+    try:
+        boot_devices = read_mount_devices(LIVE_MEDIUM_MOUNT_POINTS)
+    except OSError:
+        boot_devices = set()
+
+    disks = []
+    for name in names:
+        if name.startswith(STORAGE_IGNORED_DEVICES):
+            continue
+        path = os.path.join(block, name)
+        sectors = read_sys_int(os.path.join(path, "size"))
+        if not sectors:
+            continue
+        # the disk is the boot medium if it, or one of its partitions (e.g. sdb1 of sdb), is mounted as the boot medium
+        try:
+            partitions = [entry for entry in os.listdir(path) if entry.startswith(name)]
+        except OSError:
+            partitions = []
+        devices = {read_sys_attr(os.path.join(path, entry, "dev")) for entry in partitions}
+        devices.add(read_sys_attr(os.path.join(path, "dev")))
+
+        disk = {
+            "name": name,
+            "size_gb": sectors * SYSFS_SECTOR_SIZE / 1e9,
+            # eMMC and SD cards have a name instead of a model
+            "model": read_sys_attr(os.path.join(path, "device", "model")) or read_sys_attr(os.path.join(path, "device", "name")),
+            "rotational": read_sys_int(os.path.join(path, "queue", "rotational")) == 1,
+            "removable": read_sys_int(os.path.join(path, "removable")) == 1 or read_sys_attr(os.path.join(path, "device", "type")) == "SD",
+            "usb": "/usb" in os.path.realpath(path),
+            "boot": bool(devices & boot_devices),
+        }
+        disk["internal"] = not (disk["removable"] or disk["usb"] or disk["boot"])
+        disks.append(disk)
+    return disks
+
+########
+# This function returns the total size (in GB, rounded to an integer) of the internal disks among the given disks (see read_block_devices()),
+#   or None if there is no internal disk
+########
+def internal_storage_gb(disks):
+    sizes = [disk["size_gb"] for disk in disks if disk["internal"]]
+    return round(sum(sizes)) if sizes else None
+
+########
+# This function returns the row (a list of str, see DISK_TABLE_HEADINGS) describing the given disk (see read_block_devices()) in the table of disks
+########
+def disk_table_row(disk):
+    if disk["internal"]:
+        counted = "yes"
+    else:
+        counted = "no (" + ("boot drive" if disk["boot"] else "USB" if disk["usb"] else "removable") + ")"
+    return [disk["name"], f"{disk['size_gb']:.1f} GB", "HDD" if disk["rotational"] else "eMMC" if disk["name"].startswith("mmcblk") else "SSD", disk["model"] or "", counted]
+
+
+########
+# This function converts a capability bitmap of an input device (e.g. "B: KEY=400 0 0 0 0 0" in /proc/bus/input/devices) into an integer,
+#   so that capability n is present if bit n is set
+# The bitmap is a list of hexadecimal words separated by spaces, most significant word first
+########
+def parse_input_bitmap(value):
+    bits = 0
+    for word in value.split():
+        bits = (bits << BITS_PER_LONG) | int(word, 16)
+    return bits
+
+########
+# This function tells what kind of pointing device an input device is, from its capabilities, and returns a set
+#   containing any of "touchscreen", "touchpad" and "pen" (empty if it's none of them, e.g. a keyboard or a mouse)
+# The rules are the same as the ones udev uses to tag input devices
+########
+def classify_input_device(name, props, keys, abs_axes):
+    kinds = set()
+    has_position = bool(abs_axes >> ABS_X & 1 or abs_axes >> ABS_MT_POSITION_X & 1)
+    is_direct = bool(props >> INPUT_PROP_DIRECT & 1)
+    if has_position and keys >> BTN_TOOL_PEN & 1:
+        kinds.add("pen")
+    elif has_position and is_direct and (keys >> BTN_TOUCH & 1 or abs_axes >> ABS_MT_POSITION_X & 1):
+        kinds.add("touchscreen")
+    elif has_position and keys >> BTN_TOOL_FINGER & 1 and not is_direct:
+        kinds.add("touchpad")
+    # some touchscreens don't report INPUT_PROP_DIRECT, but they all have it in their name
+    if "touchscreen" in name.lower():
+        kinds.add("touchscreen")
+    return kinds
+
+########
+# This function returns a list of all input devices of this machine, each a dictionary with the keys "name" (str) and "kinds" (see classify_input_device())
+# It reads /proc/bus/input/devices in a single pass, or the same information from /sys/class/input if that file is not available
+# NOTE: Raises OSError if neither can be read
+########
+def read_input_devices():
+    try:
+        with open(os.path.join(PROC_ROOT, "bus", "input", "devices")) as f:
+            blocks = f.read().split("\n\n")
+    except OSError:
+        return _read_input_devices_sysfs()
+
+    devices = []
+    for block in blocks:
+        name = ""
+        bitmaps = {"PROP": 0, "KEY": 0, "ABS": 0}
+        for line in block.splitlines():
+            if line.startswith("N: Name="):
+                name = line[len("N: Name="):].strip('"')
+            elif line.startswith("B: "):
+                key, _, value = line[3:].partition("=")
+                if key in bitmaps:
+                    bitmaps[key] = parse_input_bitmap(value)
+        if name:
+            devices.append({"name": name, "kinds": classify_input_device(name, bitmaps["PROP"], bitmaps["KEY"], bitmaps["ABS"])})
+    return devices
+
+def _read_input_devices_sysfs():
+    devices = []
+    input_root = os.path.join(SYS_ROOT, "class", "input")
+    for entry in sorted(os.listdir(input_root)):
+        if not entry.startswith("input"): # skip the event/mouse handlers, which are listed in their device's folder too
+            continue
+        path = os.path.join(input_root, entry)
+        name = read_sys_attr(os.path.join(path, "name")) or ""
+        props = parse_input_bitmap(read_sys_attr(os.path.join(path, "properties")) or "0")
+        keys = parse_input_bitmap(read_sys_attr(os.path.join(path, "capabilities", "key")) or "0")
+        abs_axes = parse_input_bitmap(read_sys_attr(os.path.join(path, "capabilities", "abs")) or "0")
+        devices.append({"name": name, "kinds": classify_input_device(name, props, keys, abs_axes)})
+    return devices
+
+
+########
+# This class is a cache of the sources of hardware information (Linux commands and files under /proc and /sys) read during a run,
+#   so that each source is read at most once, however many fields and prompts need it
+# Each source is keyed by its command or path, and loaded by a function given the first time it's asked for; errors are cached too,
+#   so a source that is not available (e.g. no /sys) is not tried again either
+# It is safe to use from several threads: when a source is asked for while another thread is loading it, the second thread waits for that result
+#   instead of loading it again (single flight)
+#
+# NOTE: Sources are only read again after invalidate(), e.g. when the user asks to refresh the automatically collected fields
+########
+class SourceCache():
+    def __init__(self):
+        self._entries = dict()           # key -> {"loaded": threading.Event, "value": ..., "error": exception}
+        self._lock = threading.Lock()
+
+    ########
+    # This function returns the value of the source with the given key, calling load() to get it if it's not cached yet
+    # NOTE: Raises the exception raised by load(), if any
+    ########
+    def get(self, key, load):
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                loading = entry is None
+                if loading:
+                    entry = self._entries[key] = {"loaded": threading.Event()}
+            if loading:
+                try:
+                    entry["value"] = load()
+                except Exception as e:
+                    entry["error"] = e
+                finally:
+                    # if load() was interrupted (e.g. by Ctrl+C), nothing is cached, so that the source is loaded again the next time it's asked for
+                    if "value" not in entry and "error" not in entry:
+                        with self._lock:
+                            if self._entries.get(key) is entry:
+                                del self._entries[key]
+                    entry["loaded"].set()
+            else:
+                entry["loaded"].wait()
+            if "error" in entry:
+                raise entry["error"]
+            if "value" in entry:
+                return entry["value"]
+            # the thread loading the source was interrupted; it's loaded again by this one (or another one waiting for it)
+
+    ########
+    # This function removes the sources with the given keys (or all of them, if no key is given) from the cache, so that they are read again
+    # NOTE: Threads already waiting for a source being loaded still get that result
+    ########
+    def invalidate(self, *keys):
+        with self._lock:
+            if keys:
+                for key in keys:
+                    self._entries.pop(key, None)
+            else:
+                self._entries.clear()
+
+
+########
+# This class is an index of the PCI devices (plus network adapters on other buses, such as USB) of this machine, built from /sys in a single pass
+# Devices are indexed by their PCI class (see PCI_CLASS_XXX above), so checking whether a type of device exists is a single dictionary lookup
+# Each device is a dictionary with the following keys:
+#   - "slot": PCI slot (e.g. "0000:00:1f.6"), or network interface name for non-PCI network adapters
+#   - "bus": "pci", or the bus of a non-PCI network adapter (e.g. "usb")
+#   - "class": PCI class (int)
+#   - "vendor", "device": vendor and device ids (str, e.g. "0x8086"), or None if unknown
+#
+# NOTE: Build it with PciIndex.scan(); scan() raises OSError if /sys/bus/pci is not available
+#       It is built once per run (see EquipmentInfo._get_pci_index()) and can be reused by any field that needs PCI information
+########
+class PciIndex():
+    def __init__(self, devices):
+        self.devices = devices
+        self.by_class = dict()
+        for device in devices:
+            self.by_class.setdefault(device["class"], []).append(device)
+
+    @classmethod
+    def scan(cls):
+        devices = []
+        pci_root = os.path.join(SYS_ROOT, "bus", "pci", "devices")
+        for slot in sorted(os.listdir(pci_root)):
+            path = os.path.join(pci_root, slot)
+            pci_class = read_sys_attr(os.path.join(path, "class"))
+            if not pci_class:
+                continue
+            devices.append({
+                "slot": slot,
+                "bus": "pci",
+                "class": int(pci_class, 16) >> 8,
+                "vendor": read_sys_attr(os.path.join(path, "vendor")),
+                "device": read_sys_attr(os.path.join(path, "device")),
+            })
+        devices.extend(cls._scan_network_adapters())
+        return cls(devices)
+
+    ########
+    # This function finds network adapters that are not on the PCI bus (e.g. USB ethernet or WiFi dongles) from /sys/class/net
+    # They are added to the index under the PCI class they would have if they were PCI devices
+    ########
+    @staticmethod
+    def _scan_network_adapters():
+        adapters = []
+        net_root = os.path.join(SYS_ROOT, "class", "net")
+        try:
+            interfaces = sorted(os.listdir(net_root))
+        except OSError:
+            return adapters
+        for iface in interfaces:
+            device = os.path.join(net_root, iface, "device")
+            if not os.path.exists(device): # virtual interfaces (lo, bridges, VPNs...) have no device
+                continue
+            bus = os.path.basename(os.path.realpath(os.path.join(device, "subsystem")))
+            if bus == "pci": # already indexed
+                continue
+            if os.path.exists(os.path.join(net_root, iface, "wireless")) or os.path.exists(os.path.join(net_root, iface, "phy80211")):
+                pci_class = PCI_CLASS_NETWORK_OTHER
+            elif read_sys_attr(os.path.join(net_root, iface, "type")) == "1": # ARPHRD_ETHER
+                pci_class = PCI_CLASS_ETHERNET
+            else:
+                continue
+            usb_device = os.path.dirname(os.path.realpath(device)) # USB ids are on the parent of the interface
+            adapters.append({
+                "slot": iface,
+                "bus": bus,
+                "class": pci_class,
+                "vendor": read_sys_attr(os.path.join(usb_device, "idVendor")),
+                "device": read_sys_attr(os.path.join(usb_device, "idProduct")),
+            })
+        return adapters
+
+    def has_class(self, *pci_classes):
+        return any(pci_class in self.by_class for pci_class in pci_classes)
+
+    def devices_of_class(self, pci_class):
+        return self.by_class.get(pci_class, [])
+
+
+########
+# Local files
+# These functions read and write the files in CACHE_DIR; files are only readable by the current user, since some of them hold credentials
+########
+
+########
+# This context manager holds an exclusive lock on the given file (through a separate "<path>.lock" file) for the duration of the block
+# It is used to make sure only one process (or thread) at a time refreshes a file that is shared between processes
+########
+@contextlib.contextmanager
+def locked_file(path):
+    os.makedirs(os.path.dirname(path), mode = 0o700, exist_ok = True)
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd) # also releases the lock
+
+########
+# This function writes a string to a file atomically (readers see either the old or the new content, never a partial one),
+#   with permissions that only allow the current user to read it
+########
+def write_private_file(path, data):
+    os.makedirs(os.path.dirname(path), mode = 0o700, exist_ok = True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+########
+# This function reads a JSON file and returns its content, or None if the file doesn't exist or is corrupted
+########
+def read_json_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+########
+# This function returns the path of the cached Salesforce session; sandbox and production sessions are kept in separate files
+########
+def salesforce_session_path(sandbox):
+    return os.path.join(CACHE_DIR, "salesforce-session-sandbox.json" if sandbox else "salesforce-session.json")
+
+########
+# This function returns the cached Salesforce session (a dictionary with keys "session_id" and "instance_url") for the given user,
+#   or None if there's no cached session, it's for another user or environment, or it has expired
+########
+def load_salesforce_session(sandbox, username):
+    session = read_json_file(salesforce_session_path(sandbox))
+    if not isinstance(session, dict):
+        return None
+    if session.get("username") != username or session.get("sandbox") != sandbox or session.get("expires_at", 0) <= time.time():
+        return None
+    if not session.get("session_id") or not session.get("instance_url"):
+        return None
+    return session
+
+########
+# This function saves a Salesforce session to the cache, so that later runs can reuse it instead of logging in
+########
+def save_salesforce_session(sandbox, username, session_id, instance_url):
+    write_private_file(salesforce_session_path(sandbox), json.dumps({
+        "username": username,
+        "sandbox": sandbox,
+        "session_id": session_id,
+        "instance_url": instance_url,
+        "expires_at": time.time() + SALESFORCE_SESSION_TTL,
+    }))
+
+
+########
+# This class is the HTTP layer under all the calls to Salesforce: simple_salesforce is given its session (see EquipmentInfo._connect()), so that
+#   - connections are kept alive and reused by all threads (up to SALESFORCE_POOL_SIZE), instead of connecting again for each call
+#   - every request times out (see SALESFORCE_CONNECT_TIMEOUT and SALESFORCE_READ_TIMEOUT), so a stalled connection cannot hang the script
+#   - idempotent requests (see SALESFORCE_IDEMPOTENT_METHODS) that fail with a connection error, a timeout or a transient status
+#     (see SALESFORCE_RETRY_STATUSES) are retried after a random delay growing with each attempt, as long as the retry budget is not used up
+#   - the API usage of the organization, reported by Salesforce in the Sforce-Limit-Info header of each response, is kept in api_usage
+#
+# NOTE: requests is imported when it's created, since it's slow to import (see import_module())
+#       Updates (PATCH and POST) are never retried, since Salesforce may have applied them before the connection failed
+########
+class SalesforceHttp():
+    def __init__(self):
+        requests = import_module("requests")
+        self._errors = (requests.ConnectionError, requests.Timeout)
+        self.session = requests.Session()
+        for prefix in ("https://", "http://"):
+            self.session.mount(prefix, requests.adapters.HTTPAdapter(pool_connections = SALESFORCE_POOL_SIZE, pool_maxsize = SALESFORCE_POOL_SIZE))
+        # every request made with the session (by simple_salesforce, including logging in) goes through request() below
+        self._send = self.session.request
+        self.session.request = self.request
+
+        self.api_usage = None            # (used, limit) of the daily API requests of the organization, as last reported by Salesforce, or None if unknown
+        self.retries_left = SALESFORCE_RETRY_BUDGET
+        self._usage_warned = False
+        self._lock = threading.Lock()
+
+    ########
+    # This function sends a request (with the same arguments as requests.Session.request()), retrying it if needed, and returns the response
+    # NOTE: Raises the exception of the last attempt (e.g. requests.Timeout) if it failed; a response with an error status is returned as is
+    ########
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (SALESFORCE_CONNECT_TIMEOUT, SALESFORCE_READ_TIMEOUT)
+        idempotent = method.upper() in SALESFORCE_IDEMPOTENT_METHODS
+        # a file being uploaded (e.g. the CSV data of a Bulk API job) is sent again from the same position when retrying
+        data = kwargs.get("data")
+        position = data.tell() if hasattr(data, "seek") else None
+        attempt = 1
+        while True:
+            with trace_span(f"{method.upper()} {urllib.parse.urlsplit(url).path}", "http", attempt = attempt) as span:
+                try:
+                    response = self._send(method, url, **kwargs)
+                except self._errors as e:
+                    span.set(error = type(e).__name__)
+                    if not (idempotent and attempt < SALESFORCE_MAX_ATTEMPTS and self._take_retry()):
+                        raise
+                else:
+                    span.set(status = response.status_code)
+                    self._track_usage(response)
+                    if not (idempotent and response.status_code in SALESFORCE_RETRY_STATUSES and attempt < SALESFORCE_MAX_ATTEMPTS and self._take_retry()):
+                        return response
+                    response.close()
+            time.sleep(random.uniform(0, SALESFORCE_RETRY_DELAY * 2 ** (attempt - 1)))
+            if position is not None:
+                data.seek(position)
+            attempt += 1
+
+    ########
+    # This function restores the retry budget, e.g. before each flush of a long-running collector
+    ########
+    def reset_retry_budget(self):
+        with self._lock:
+            self.retries_left = SALESFORCE_RETRY_BUDGET
+
+    ########
+    # This function describes the API usage of the organization (e.g. "18/15000 API requests used today"), or returns None if it's not known yet
+    ########
+    def describe_usage(self):
+        if self.api_usage is None:
+            return None
+        return f"{self.api_usage[0]}/{self.api_usage[1]} API requests used today"
+
+    def _take_retry(self):
+        with self._lock:
+            if self.retries_left <= 0:
+                return False
+            self.retries_left -= 1
+            return True
+
+    def _track_usage(self, response):
+        r = SALESFORCE_API_USAGE_PATTERN.search(response.headers.get("Sforce-Limit-Info", ""))
+        if not r:
+            return
+        used, limit = int(r.group(1)), int(r.group(2))
+        with self._lock:
+            self.api_usage = (used, limit)
+            warn = not self._usage_warned and used >= limit * SALESFORCE_API_USAGE_WARNING
+            self._usage_warned = self._usage_warned or warn
+        if warn:
+            print(f"\033[93mWarning: {self.describe_usage()}; Salesforce refuses all requests once the limit is reached\033[00m")
+
+
+########
+# This function returns the path of the field cache, which holds the auto fields collected on this machine during the current boot,
+#   so that running the script again on the same machine (e.g. after a typo or a crash) doesn't collect them again
+########
+def field_cache_path():
+    return os.path.join(CACHE_DIR, "field-cache.json")
+
+########
+# This function returns a fingerprint (str) of this machine and its current boot, from its DMI product UUID or board serial number (see MACHINE_ID_FILES)
+#   and the kernel's boot id, or None if either cannot be read
+########
+def machine_fingerprint():
+    boot_id = read_sys_attr(os.path.join(PROC_ROOT, "sys", "kernel", "random", "boot_id"))
+    machine_id = None
+    for path in [os.path.join(SYS_ROOT, path) for path in MACHINE_ID_FILES] + [MACHINE_ID_FALLBACK]:
+        machine_id = read_sys_attr(path)
+        if machine_id:
+            break
+    if not boot_id or not machine_id:
+        return None
+    return hashlib.sha256(f"{machine_id}\n{boot_id}".encode()).hexdigest()
+
+########
+# This function returns a signature (str) of the hotplug-sensitive source of the given auto field (see AUTO_FIELDS_HOTPLUG_SOURCES),
+#   which changes when a device is added, removed or swapped; fields that cannot change until a reboot have the signature ""
+########
+def hotplug_signature(field):
+    if field not in AUTO_FIELDS_HOTPLUG_SOURCES:
+        return ""
+    directory, attributes = AUTO_FIELDS_HOTPLUG_SOURCES[field]
+    root = os.path.join(SYS_ROOT, directory)
+    digest = hashlib.sha256()
+    try:
+        entries = sorted(os.listdir(root))
+    except OSError:
+        entries = []
+    for entry in entries:
+        digest.update(entry.encode() + b"\0")
+        for attribute in attributes:
+            try:
+                with open(os.path.join(root, entry, attribute), "rb") as f:
+                    digest.update(f.read())
+            except OSError:
+                pass
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+########
+# This function returns the auto fields cached for the machine with the given fingerprint, as a dictionary mapping each field to
+#   a dictionary with keys "value" and "signature" (see hotplug_signature()), or an empty dictionary if none are cached
+########
+def load_field_cache(fingerprint):
+    cache = read_json_file(field_cache_path())
+    if not isinstance(cache, dict) or cache.get("fingerprint") != fingerprint or not isinstance(cache.get("fields"), dict):
+        return dict()
+    return cache["fields"]
+
+########
+# This function saves the auto fields collected on the machine with the given fingerprint (a dictionary, see load_field_cache()) to the field cache,
+#   replacing the fields of any other machine or boot
+########
+def save_field_cache(fingerprint, fields):
+    write_private_file(field_cache_path(), json.dumps({"fingerprint": fingerprint, "fields": fields}))
+
+
+########
+# These functions read and update the collector costs: a running average (an exponentially weighted moving average) of the time (in seconds) each
+#   collector took on this machine, used to start the cheapest collectors first (see EquipmentInfo.start_collection())
+#   - load_collector_costs(): returns a dictionary mapping field to its average time (empty if it's never been measured)
+#   - save_collector_costs(): adds the times measured in this run (a dictionary mapping field to seconds) to the averages
+########
+def collector_costs_path():
+    return os.path.join(CACHE_DIR, "collector-costs.json")
+
+def load_collector_costs():
+    costs = read_json_file(collector_costs_path())
+    if not isinstance(costs, dict):
+        return dict()
+    return {field: cost for field, cost in costs.items() if isinstance(cost, (int, float))}
+
+def save_collector_costs(times):
+    with locked_file(collector_costs_path()):
+        costs = load_collector_costs()
+        for field, seconds in times.items():
+            old = costs.get(field)
+            costs[field] = seconds if old is None else AUTO_FIELD_COST_WEIGHT * seconds + (1 - AUTO_FIELD_COST_WEIGHT) * old
+        write_private_file(collector_costs_path(), json.dumps(costs))
+
+
+########
+# This function returns the path of the local CRID index (see CridIndex); sandbox and production indexes are kept in separate files
+########
+def crid_index_path(sandbox):
+    return os.path.join(CACHE_DIR, "crid-index-sandbox.tsv" if sandbox else "crid-index.tsv")
+
+
+########
+# This class is a local index of all the Equipment__c records in Salesforce, mapping each CRID (Computer_Reach_ID__c) to its record id,
+#   so that entered CRIDs can be checked instantly, without asking Salesforce
+# It is filled by a single query the first time, and then kept up to date by only asking for the records modified since the last sync (by SystemModstamp)
+#
+# On disk, it's a text file with one "<CRID><TAB><record id>" line per record, sorted by CRID, after a first line holding the time of the last sync
+# NOTE: It's safe to use from several threads; sync() and save() should be called with the file locked (see locked_file()), since other processes share it
+########
+class CridIndex():
+    def __init__(self, ids=None, synced_at=None):
+        self.synced_at = synced_at       # SystemModstamp of the latest record seen (str, e.g. "2023-01-31T12:00:00Z"), or None if never synced
+        self._ids = ids or dict()        # CRID (str) -> record id (str)
+        self._crids = sorted(self._ids)  # all CRIDs, sorted, for prefix search
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    @classmethod
+    def load(cls, path):
+        ids = dict()
+        synced_at = None
+        try:
+            with open(path) as f:
+                synced_at = f.readline().strip() or None
+                for line in f:
+                    crid, sep, eid = line.rstrip("\n").partition("\t")
+                    if sep:
+                        ids[crid] = eid
+        except OSError:
+            return cls()
+        return cls(ids, synced_at)
+
+    def save(self, path):
+        with self._lock:
+            lines = [f"{crid}\t{self._ids[crid]}\n" for crid in self._crids]
+            synced_at = self.synced_at
+        write_private_file(path, (synced_at or "") + "\n" + "".join(lines))
+
+    ########
+    # This function returns the record id of the given CRID, or None if it's not in the index
+    ########
+    def lookup(self, crid):
+        return self._ids.get(crid)
+
+    ########
+    # This function returns up to limit CRIDs (sorted) that start with the given prefix
+    ########
+    def search(self, prefix, limit=CRID_SUGGESTIONS):
+        with self._lock:
+            start = bisect.bisect_left(self._crids, prefix)
+            matches = []
+            for crid in self._crids[start:start + limit]:
+                if not crid.startswith(prefix):
+                    break
+                matches.append(crid)
+            return matches
+
+    ########
+    # This function brings the index up to date, where query is a function that runs a SOQL query (and includes deleted records if asked to),
+    #   and returns the resulting records (any iterable), e.g. lambda soql, include_deleted: sf.query_all_iter(soql, include_deleted=include_deleted)
+    # The first sync fetches all the records; later ones only fetch the records modified (or deleted) since the previous one
+    ########
+    def sync(self, query):
+        soql = f"SELECT Id, {ALL_FIELDS_API_NAMES['CRID']}, SystemModstamp, IsDeleted FROM Equipment__c"
+        if self.synced_at:
+            # records modified in the same second as the last sync are fetched again, which is harmless
+            records = query(f"{soql} WHERE SystemModstamp >= {self.synced_at} ORDER BY SystemModstamp", True)
+        else:
+            records = query(f"{soql} WHERE {ALL_FIELDS_API_NAMES['CRID']} != null ORDER BY SystemModstamp", False)
+
+        with self._lock:
+            crids_by_id = {eid: crid for crid, eid in self._ids.items()} if self.synced_at else dict()
+            for record in records:
+                # the CRID of a record may have changed since the last sync, so the old one is always removed first
+                old_crid = crids_by_id.pop(record["Id"], None)
+                if old_crid is not None:
+                    del self._ids[old_crid]
+                crid = record[ALL_FIELDS_API_NAMES["CRID"]]
+                if crid and not record["IsDeleted"]:
+                    self._ids[crid] = record["Id"]
+                    crids_by_id[record["Id"]] = crid
+                self.synced_at = salesforce_timestamp(record["SystemModstamp"])
+            self._crids = sorted(self._ids)
+
+########
+# This function converts a timestamp returned by Salesforce (e.g. "2023-01-31T12:00:00.000+0000") into the format used in SOQL queries (e.g. "2023-01-31T12:00:00Z")
+########
+def salesforce_timestamp(value):
+    timestamp = datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+    return timestamp.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+########
+# This function converts a timestamp returned by Salesforce into the format of HTTP dates (e.g. "Tue, 31 Jan 2023 12:00:01 GMT"), used in If-Unmodified-Since
+# HTTP dates have no milliseconds, so the timestamp is rounded up to the next second; otherwise the record would always look modified after it
+########
+def http_date(value):
+    timestamp = datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+    if timestamp.microsecond:
+        timestamp = timestamp.replace(microsecond = 0) + datetime.timedelta(seconds = 1)
+    return import_module("email.utils").format_datetime(timestamp.astimezone(datetime.timezone.utc), usegmt = True)
+
+########
+# This function returns the fields of a record (as returned by EquipmentInfo._convert_to_record()) whose values differ from those of
+#   the same record currently in Salesforce (a dictionary of field API names to values), i.e. the fields that need to be updated
+# Values are compared the way Salesforce stores them: numbers by value (3 == 3.0), multi-select picklists regardless of order, and empty text as no value
+########
+def record_changes(record, current):
+    changes = dict()
+    for name, value in record.items():
+        old = current.get(name)
+        if name == ALL_FIELDS_API_NAMES["video_ports"]:
+            same = set(filter(None, (value or "").split(";"))) == set(filter(None, (old or "").split(";")))
+        elif isinstance(value, str) and isinstance(old, str):
+            same = value == old
+        elif isinstance(value, bool) or isinstance(old, bool):
+            same = value is old
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)):
+            same = float(value) == float(old)
+        else:
+            same = (value if value != "" else None) == (old if old != "" else None)
+        if not same:
+            changes[name] = value
+    return changes
+
+
+########
+# This function returns the path of the upload spool (see UploadSpool); sandbox and production records are kept in separate files
+########
+def upload_spool_path(sandbox):
+    return os.path.join(CACHE_DIR, "upload-spool-sandbox.sqlite" if sandbox else "upload-spool.sqlite")
+
+
+########
+# This class is a durable queue of records to be uploaded to Salesforce, kept in a SQLite database
+# Records are written to the spool first, and then sent by flush(), so no audit is lost when the network is down: records that cannot be sent stay
+#   in the spool, and are retried (with increasing delays) the next time it's flushed
+#
+# Each record has a status:
+#   - "pending": waiting to be sent (or retried)
+#   - "sent": accepted by Salesforce
+#   - "failed": rejected by Salesforce (e.g. the record was deleted), or could not be sent after SPOOL_MAX_ATTEMPTS attempts; see its last_error
+#   - "superseded": replaced by a newer record with the same CRID before it was sent
+# NOTE: It's safe to use from several threads and processes; every operation opens its own connection
+########
+class UploadSpool():
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), mode = 0o700, exist_ok = True)
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                crid TEXT NOT NULL,
+                record_id TEXT,
+                payload TEXT NOT NULL,
+                modstamp TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS records_status ON records (status, next_attempt_at)")
+            # spools created by earlier versions of the script don't have the modstamp column yet
+            if "modstamp" not in [column["name"] for column in db.execute("PRAGMA table_info(records)")]:
+                db.execute("ALTER TABLE records ADD COLUMN modstamp TEXT")
+        os.chmod(path, 0o600)
+
+    ########
+    # This context manager opens a connection to the spool, commits (or rolls back, if an exception is raised) at the end of the block,
+    #   and closes the connection, so that none is left open by the threads of the collector or the bench station mode
+    ########
+    @contextlib.contextmanager
+    def _connect(self):
+        sqlite3 = import_module("sqlite3")
+        db = sqlite3.connect(self.path, timeout = 30)
+        try:
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = FULL") # make sure a record is on disk before add() returns
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    ########
+    # This function adds a record to the spool and returns its id in the spool; record_id is the Salesforce id, and payload the record (a dictionary)
+    # modstamp is the SystemModstamp of the record in Salesforce the payload was compared with (see EquipmentInfo.upload_record()), if any;
+    #   the record is then only updated if it has not been modified in Salesforce since
+    # A pending record with the same CRID is superseded, since only the latest data should be uploaded
+    ########
+    def add(self, crid, record_id, payload, modstamp=None):
+        now = time.time()
+        with self._connect() as db:
+            db.execute("UPDATE records SET status = 'superseded', updated_at = ? WHERE crid = ? AND status = 'pending'", (now, crid))
+            cursor = db.execute("INSERT INTO records (crid, record_id, payload, modstamp, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (crid, record_id, json.dumps(payload), modstamp, now, now))
+            return cursor.lastrowid
+
+    ########
+    # This function returns a record in the spool (a sqlite3.Row with all the columns above) by its id in the spool
+    ########
+    def get(self, spool_id):
+        with self._connect() as db:
+            return db.execute("SELECT * FROM records WHERE id = ?", (spool_id,)).fetchone()
+
+    ########
+    # This function returns the number of records in the spool for each status, as a dictionary
+    ########
+    def counts(self):
+        with self._connect() as db:
+            return {row["status"]: row["n"] for row in db.execute("SELECT status, COUNT(*) AS n FROM records GROUP BY status")}
+
+    ########
+    # This function sends all the pending records that are due for a (re)try (or all the pending records if force is True), in batches of up to SPOOL_BATCH_SIZE records
+    # send is a function that takes a list of (record_id, payload, modstamp) and returns one result per record, in the same order,
+    #   as returned by Salesforce's sObject Collections API: a dictionary with keys "success" (bool) and "errors" (list of {"message": str, ...}),
+    #   and optionally "retry" (bool) if the record could not be sent and should be retried later (e.g. its request timed out)
+    # If send raises an exception (e.g. the network is down), the whole batch is retried later; either way, flushing stops
+    # Returns the number of records sent
+    #
+    # NOTE: The spool is locked while flushing, so two processes never send the same records at the same time
+    ########
+    def flush(self, send, force=False):
+        sent = 0
+        last_id = 0
+        with locked_file(self.path):
+            while True:
+                now = time.time()
+                with self._connect() as db:
+                    # records retried later get a new next_attempt_at, so when forced they are skipped by id instead, to send each one only once
+                    rows = db.execute("SELECT * FROM records WHERE status = 'pending' AND next_attempt_at <= ? AND id > ? ORDER BY id LIMIT ?",
+                        (float("inf") if force else now, last_id, SPOOL_BATCH_SIZE)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+
+                try:
+                    results = send([(row["record_id"], json.loads(row["payload"]), row["modstamp"]) for row in rows])
+                except Exception as e:
+                    with self._connect() as db:
+                        for row in rows:
+                            self._retry_later(db, row, str(e) or type(e).__name__, now)
+                    break
+
+                with self._connect() as db:
+                    for row, result in zip(rows, results):
+                        if result.get("retry"):
+                            self._retry_later(db, row, "; ".join(err.get("message", "") for err in result.get("errors", [])) or "not sent", now)
+                        elif result.get("success"):
+                            db.execute("UPDATE records SET status = 'sent', attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE id = ?", (now, row["id"]))
+                            sent += 1
+                        else:
+                            error = "; ".join(err.get("message", "") for err in result.get("errors", [])) or "rejected by Salesforce"
+                            db.execute("UPDATE records SET status = 'failed', attempts = attempts + 1, last_error = ?, updated_at = ? WHERE id = ?", (error, now, row["id"]))
+                if len(rows) < SPOOL_BATCH_SIZE or any(result.get("retry") for result in results):
+                    break
+
+            with self._connect() as db:
+                db.execute("DELETE FROM records WHERE status IN ('sent', 'superseded') AND updated_at < ?", (time.time() - SPOOL_KEEP_SENT,))
+        return sent
+
+    def _retry_later(self, db, row, error, now):
+        attempts = row["attempts"] + 1
+        if attempts >= SPOOL_MAX_ATTEMPTS:
+            db.execute("UPDATE records SET status = 'failed', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?", (attempts, error, now, row["id"]))
+        else:
+            # wait twice as long after each attempt, with some randomness so that benches that lost the network together don't all retry at once
+            delay = min(SPOOL_MAX_BACKOFF, SPOOL_BACKOFF * 2 ** (attempts - 1)) * random.uniform(0.5, 1)
+            db.execute("UPDATE records SET attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (attempts, now + delay, error, now, row["id"]))
+
+
+########
+# Fleet collector
+# A collector is a small HTTP service (started with the "serve" command) that the machines being audited send their records to, instead of
+#   uploading them to Salesforce themselves (with --collector URL); it keeps the latest record of each CRID and upserts them to Salesforce in large batches
+# This way only the collector needs Salesforce credentials, and a bench makes a few large API calls instead of a few per machine
+#
+# API (all bodies are JSON):
+#   - GET /crids/<CRID>: {"Id": <record id>} of the record with this CRID, or 404 if there is none
+#   - POST /records: a record (as returned by EquipmentInfo._convert_to_record()), or a list of them; answers with one {"success": true}
+#     (or {"success": false, "errors": [{"message": ...}]}) per record; bodies larger than COLLECTOR_MAX_BODY are refused (413)
+#   - GET /status: number of records in the collector's spool for each status
+# If the environment variable HW_COLLECTOR_TOKEN is set (on both sides), requests must carry it as "Authorization: Bearer <token>";
+#   it's required unless the collector only listens on the loopback interface
+# Only records whose CRID is already in Salesforce are accepted: like the interactive mode, the collector never creates records
+########
+
+########
+# This function returns the path of the collector's spool (see UploadSpool); sandbox and production records are kept in separate files
+########
+def collector_spool_path(sandbox):
+    return os.path.join(CACHE_DIR, "collector-spool-sandbox.sqlite" if sandbox else "collector-spool.sqlite")
+
+########
+# This function returns whether the given host (a name or an IP address; empty means all interfaces) only accepts connections from this machine
+########
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return import_module("ipaddress").ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+########
+# This function sends a request to a collector, and returns the answer as a tuple (HTTP status code, JSON body)
+# NOTE: Raises OSError (urllib.error.URLError) if the collector cannot be reached
+########
+def collector_request(url, method, path, body=None):
+    urllib_request = import_module("urllib.request")
+    urllib_error = import_module("urllib.error")
+    request = urllib_request.Request(url.rstrip("/") + path, method = method, data = None if body is None else json.dumps(body).encode())
+    request.add_header("Content-Type", "application/json")
+    if os.getenv("HW_COLLECTOR_TOKEN"):
+        request.add_header("Authorization", f"Bearer {os.getenv('HW_COLLECTOR_TOKEN')}")
+    try:
+        with urllib_request.urlopen(request, timeout = COLLECTOR_TIMEOUT) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib_error.HTTPError as e:
+        try:
+            return e.code, json.loads(e.read() or b"null")
+        except ValueError:
+            return e.code, None
+
+
+########
+# This class handles the requests sent to a collector (see above); the server it belongs to has the attributes:
+#   - collector: the EquipmentInfo used to look up CRIDs and talk to Salesforce
+#   - spool: the UploadSpool records are queued in
+#   - flush_now: a threading.Event set when enough records are queued to fill a batch
+# NOTE: serve_collector() makes it a subclass of http.server.BaseHTTPRequestHandler, since http.server is only imported then (see import_module())
+########
+class CollectorRequestHandler():
+    def do_GET(self):
+        if not self._authorized():
+            return
+        path = urllib.parse.urlparse(self.path).path
+        if path.startswith("/crids/"):
+            crid = urllib.parse.unquote(path[len("/crids/"):])
+            eid = self.server.collector._lookup_CRID(crid)
+            if not eid: # the record may have been added since the last sync
+                self.server.collector._sync_CRID_index()
+                eid = self.server.collector._crid_index.lookup(crid)
+            if eid:
+                self._reply(200, {"Id": eid})
+            else:
+                self._reply(404, {"error": f"there is no record with CRID {crid} in Salesforce"})
+        elif path == "/status":
+            self._reply(200, self.server.spool.counts())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if urllib.parse.urlparse(self.path).path != "/records":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._reply(400, {"error": "invalid Content-Length"})
+            return
+        if length > COLLECTOR_MAX_BODY:
+            self._reply(413, {"error": f"too large; send at most {COLLECTOR_MAX_BODY} bytes per request"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError: # also raised for text that is not UTF-8
+            self._reply(400, {"error": "invalid JSON"})
+            return
+
+        records = body if isinstance(body, list) else [body]
+        errors = [self._validate(record) for record in records]
+        # the collector only updates existing records, like the interactive mode, and never creates them: records of CRIDs that are not
+        #   in the CRID index are rejected, after syncing it once, since the records may have been added to Salesforce since the last sync
+        index = self.server.collector._crid_index
+        if any(not error and not index.lookup(record[ALL_FIELDS_API_NAMES["CRID"]]) for record, error in zip(records, errors)):
+            self.server.collector._sync_CRID_index()
+            index = self.server.collector._crid_index
+        errors = [error or (None if index.lookup(record[ALL_FIELDS_API_NAMES["CRID"]]) else
+            f"there is no record with CRID {record[ALL_FIELDS_API_NAMES['CRID']]} in Salesforce") for record, error in zip(records, errors)]
+
+        results = []
+        for record, error in zip(records, errors):
+            if error:
+                results.append({"success": False, "errors": [{"message": error}]})
+            else:
+                # a pending record with the same CRID is superseded, so only the latest one is uploaded
+                self.server.spool.add(record[ALL_FIELDS_API_NAMES["CRID"]], None, record)
+                results.append({"success": True})
+        if self.server.spool.counts().get("pending", 0) >= SPOOL_BATCH_SIZE:
+            self.server.flush_now.set()
+        self._reply(200, results)
+
+    def _validate(self, record):
+        if not isinstance(record, dict) or not record.get(ALL_FIELDS_API_NAMES["CRID"]):
+            return f"a record must be an object with a {ALL_FIELDS_API_NAMES['CRID']}"
+        unknown = [name for name in record if name not in ALL_FIELDS_API_NAMES.values()]
+        if unknown:
+            return f"unknown field(s) {unknown}"
+        return None
+
+    def _authorized(self):
+        token = os.getenv("HW_COLLECTOR_TOKEN")
+        if token and self.headers.get("Authorization") != f"Bearer {token}":
+            self._reply(401, {"error": "unauthorized"})
+            return False
+        return True
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+########
+# This function converts field values (a dictionary mapping field names, as in ALL_FIELDS_API_NAMES, to values) into the JSON format accepted
+#   by the database schema in Salesforce (a dictionary mapping API names to values); fields with no value are left out
+# NOTE: Most fields, such as those of boolean or number types, don't require extra convertion, because their values can be uploaded as is into Salesforce
+#       However, some fields, such as multi-select, require the data to be a special format, hence MUST be converted in this function
+#       For some other fields, we may also want to convert the data due to some requirements,
+#         e.g. in this function we change battery health from just a number, to a number followed by a % sign, so that it's more readable in Salesforce
+########
+def fields_to_record(values):
+    record = dict()
+    for field in ALL_FIELDS_API_NAMES:
+        var = values.get(field)
+        if var != None:
+            if field == "video_ports": # this is a picklist (multi-select) field in Salesforce, so data should be in the format of "selection1;selection2;..."
+                var = ";".join(var)
+            elif field == "battery_health": # add a % sign after the number for readability
+                var = str(var) + "%"
+            record[ALL_FIELDS_API_NAMES[field]] = var
+    return record
+
+########
+# This function reads the saved audit results (JSON files, as written by the unattended mode with --result) in the given directory, one at a time,
+#   and yields a tuple (file name, CRID, record, error) for each of them, where record is in the format of fields_to_record()
+# The record is built from the "fields" of the result if it has them, or else taken from its "record"; files that are not audit results
+#   (or have no CRID) are yielded with a record of None and an error describing the problem
+# NOTE: Files are read one at a time, in the order the directory lists them, so memory use does not depend on the number of files
+########
+def read_audit_results(directory):
+    api_names = set(ALL_FIELDS_API_NAMES.values())
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json") or not entry.is_file():
+                continue
+            result = read_json_file(entry.path)
+            if not isinstance(result, dict):
+                yield entry.name, None, None, "not a JSON object (or cannot be read)"
+                continue
+            if isinstance(result.get("fields"), dict):
+                record = fields_to_record(result["fields"])
+            elif isinstance(result.get("record"), dict):
+                record = {name: value for name, value in result["record"].items() if name in api_names}
+            else:
+                yield entry.name, None, None, "has neither \"fields\" nor \"record\""
+                continue
+            crid = record.get(ALL_FIELDS_API_NAMES["CRID"])
+            if not crid:
+                yield entry.name, None, None, "has no CRID"
+                continue
+            yield entry.name, crid, record, None
+
+########
+# This function converts a record value into its CSV format for Salesforce's Bulk API (str)
+# NOTE: Empty values leave the field unchanged in Salesforce
+########
+def bulk_csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
 
 class EquipmentInfo():
-    def __init__(self):                  # description                     # type
+    def __init__(self):
+        self.reset_fields()
+
+        # command line arguments
+        parser = argparse.ArgumentParser(description = description)
+        parser.add_argument("-t", "--test", action='store_true', help="test the script on Salesforce Sandbox")
+        parser.add_argument("-c", "--cml", action='store_true', help="run the command line version (without GUI)")
+        parser.add_argument("--loop", action='store_true', help="bench station mode: run the command line version for one unit after another in the same process, staying logged in to Salesforce")
+        parser.add_argument("--startup-profile", action='store_true', help="report the time spent in each import and initialization step at exit")
+        parser.add_argument("--profile", metavar="FILE", help="record how long each stage, Salesforce call, collector and Linux command takes, and write it to FILE at exit (a trace for chrome://tracing or ui.perfetto.dev)")
+        parser.add_argument("--manifest", metavar="FILE", help="run unattended: read the manual fields from a JSON (or YAML) file, skip the review, and upload")
+        parser.add_argument("--set", metavar="FIELD=VALUE", action='append', default=[], help="run unattended (see --manifest) with this manual field value; can be repeated, and overrides the manifest")
+        parser.add_argument("--result", metavar="FILE", default="-", help="in unattended mode, where to write the result as JSON (default: standard output)")
+        parser.add_argument("--no-cache", action='store_true', help="collect all the automatic fields, instead of reusing the ones collected by an earlier run on this machine since it was started")
+        parser.add_argument("--collector", metavar="URL", help="send records to the fleet collector at this URL (see the serve command) instead of Salesforce; no Salesforce credentials are needed")
+        subparsers = parser.add_subparsers(dest = "command", metavar = "command")
+        subparsers.add_parser("flush", help = "upload the records saved locally while Salesforce could not be reached, and exit")
+        serve_parser = subparsers.add_parser("serve", help = "run a fleet collector that machines send their records to (with --collector), and that uploads them to Salesforce in batches")
+        serve_parser.add_argument("--listen", metavar="HOST:PORT", default=COLLECTOR_ADDRESS, help=f"address to listen on (default: {COLLECTOR_ADDRESS})")
+        serve_parser.add_argument("--flush-interval", metavar="SECONDS", type=float, default=COLLECTOR_FLUSH_INTERVAL, help=f"seconds between uploads to Salesforce (default: {COLLECTOR_FLUSH_INTERVAL})")
+        import_parser = subparsers.add_parser("import", help = "upload a directory of saved audit results (see --result) to Salesforce with the Bulk API, and exit")
+        import_parser.add_argument("directory", help="directory of the saved audit results (JSON files)")
+        import_parser.add_argument("--operation", choices=["upsert", "update"], default="upsert", help="upsert records by CRID (the default; records with a new CRID are created), or only update existing ones")
+        import_parser.add_argument("--failures", metavar="FILE", default=BULK_FAILURES_FILE, help=f"CSV file the records that could not be imported are written to (default: {BULK_FAILURES_FILE})")
+        with startup_step("argument parsing"):
+            self._args = parser.parse_args()
+        if self._args.startup_profile:
+            atexit.register(print_startup_profile)
+        if self._args.profile:
+            start_tracing()
+            atexit.register(write_trace, self._args.profile)
+
+        # Salesforce authentication
+        self.sf = None
+        self._salesforce_http = None     # HTTP connections to Salesforce, shared by all calls (see SalesforceHttp); created when connecting
+        if not self._args.collector and not self.check_credentials():
+            sys.exit(1)
+        if self._args.command == "serve":
+            sys.exit(self.serve_collector())
+        if self._args.command == "import":
+            if self._args.collector:
+                parser.error("the import command uploads to Salesforce directly, and cannot be used with --collector")
+            sys.exit(self.import_records())
+
+        # records that could not be uploaded yet are kept in the upload spool
+        self._spool = UploadSpool(upload_spool_path(self._args.test))
+        if self._args.command == "flush":
+            sys.exit(self.flush_uploads())
+
+        # log in to Salesforce and collect the auto fields in the background right away, while the user enters the manual fields
+        # (the login, the CRID index sync, and later the CRID lookup, run on self._background; the collectors run on their own threads, see start_collection())
+        self._background = concurrent.futures.ThreadPoolExecutor(max_workers = 4, thread_name_prefix = "background")
+        self._login = self._start_login()
+
+        # the local CRID index is loaded right away, so entered CRIDs can be checked even before logging in, and then synced in the background
+        self._crid_index = CridIndex.load(crid_index_path(self._args.test))
+        self._crid_index_sync = self._background.submit(self._sync_CRID_index)
+
+        # records left in the upload spool by earlier runs are sent in the background too
+        self._background.submit(self._flush_spool)
+        self._crid_lookup = None         # lookup of the Salesforce id of the entered CRID, running in the background (see _start_CRID_lookup())
+        self._record_fetch = None        # fetch of the current values of that record in Salesforce, running in the background (see _fetch_record())
+        self._collection = None          # auto field collectors running in the background (see start_collection())
+        self._collection_generation = 0  # number of collections started so far; collectors of an earlier one are ignored (see _run_collector())
+        self.start_collection()
+
+        # the storage size is filled in with the total size of the internal disks; it can still be changed when it's entered (or in a manifest)
+        self.storage = self._detect_storage()
+
+        # run unattended
+        if self._args.manifest or self._args.set:
+            sys.exit(self.run_unattended())
+        # run the command line version, for one unit or (with --loop) one after another
+        elif self._args.loop:
+            self.run_station()
+        elif self._args.cml:
+            self.audit_unit()
+        else: # run the GUI version
+            self.start_GUI()
+
+    ########
+    # This function runs all the stages of the command line version, auditing one unit
+    ########
+    def audit_unit(self):
+        for stage in (self.data_input, self.confirm_CRID, self.data_collection, self.data_review, self.data_upload):
+            with trace_span(stage.__name__, "stage"):
+                stage()
+
+    ########
+    # This function runs the bench station mode (--loop): it audits units one after another with the command line version, until the user quits
+    # The Salesforce connection, the CRID index, the upload spool and the loaded modules are kept from one unit to the next, so only the first unit
+    #   waits for logging in; after each unit, the number of units audited per hour since the station started is shown
+    ########
+    def run_station(self):
+        started = time.monotonic()
+        units = 0
+        while True:
+            with trace_span("unit", "stage", unit = units + 1):
+                self.audit_unit()
+            units += 1
+            elapsed = time.monotonic() - started
+            print(f"\033[92m{units} unit(s) audited in {elapsed / 60:.1f} min ({units * 3600 / elapsed:.1f} units/hour)\033[00m")
+            if input("\033[44mPress ENTER to audit the next unit, or enter q to quit: \033[00m").strip().lower() == "q":
+                break
+            print()
+            self.next_unit()
+
+    ########
+    # This function gets ready to audit the next unit in the bench station mode: everything about the previous unit is forgotten (see reset_fields()),
+    #   and its auto fields are collected in the background again, reading all the hardware again (the field cache is not used, since the unit changed)
+    # The CRID index is synced again too, so that records added in Salesforce since the station started are found right away,
+    #   and each unit gets a full budget of retries of Salesforce calls (see SalesforceHttp), so that a station running all day keeps retrying
+    ########
+    def next_unit(self):
+        if self._salesforce_http is not None:
+            self._salesforce_http.reset_retry_budget()
+        self.reset_fields()
+        self._crid_lookup = None
+        self._record_fetch = None
+        self._collection = None
+        self._crid_index_sync = self._background.submit(self._sync_CRID_index)
+        self.start_collection(use_cache = False)
+        self.storage = self._detect_storage()
+
+    ########
+    # This function sets all the fields (and everything else that is specific to the machine being audited) to their initial, empty values
+    # NOTE: It's also used to build an EquipmentInfo without running the whole audit, e.g. in benchmark.py, and between units in the bench station mode
+    ########
+    def reset_fields(self):              # description                     # type
         # manually input fields
         # NOTE: If adding a new manual field, MUST add a new class variable (as shown below) AND add the new variable name as is in self.manual_fields
         #       Also needs to update ALL_FIELDS_API_NAMES above correspondingly
@@ -91,7 +1874,7 @@ class EquipmentInfo():
         
         # automatically collected fields
         # NOTE: If adding a new auto field, MUST add a new class variable (as shown below) AND add the new variable name as is in self.auto_fields
-        #       Furthermore, add the corresponding Linux commands to be run in AUTO_FIELDS_LINUX_COMMANDS above
+        #       Furthermore, add a collector function _xxx_collector (see data_collection()), and the Linux commands it runs (if any) to AUTO_FIELDS_LINUX_COMMANDS above
         self.model_name = None           # CPU model                         str
         self.RAM = None                  # RAM size (GB)                     int
         self.screen_size = None          # Screen size (inch)                int
@@ -114,33 +1897,25 @@ class EquipmentInfo():
         self._errors = dict()            # Stores all the errors that occur when running Linux commands for the automatically collected fields
                                          # Data type: a dictionary mapping from field name (str) to error message (str)
 
-        # Salesforce internal id
-        self.eid = None                  
+        # Linux commands run and files read so far to collect the fields of this machine (see SourceCache, _read_source() and _run_command())
+        self._sources = SourceCache()
 
-        # command line arguments
-        parser = argparse.ArgumentParser(description = description)
-        parser.add_argument("-t", "--test", action='store_true', help="test the script on Salesforce Sandbox")
-        parser.add_argument("-c", "--cml", action='store_true', help="run the command line version (without GUI)")
-        self._args = parser.parse_args()
+        # auto fields reused from the field cache instead of being collected (see start_collection()), and the signature of the hotplug-sensitive source
+        # of each auto field when it was collected (see hotplug_signature())
+        self._cached_fields = set()
+        self._field_signatures = dict()
 
-        # Salesforce authentication
-        self.sf = None
-        if self.authenticate():
-            # run the command line version
-            if self._args.cml:
-                self.data_input()
-                self.data_collection()
-                self.data_review()
-                self.data_upload()
-            else: # run the GUI version
-                self.start_GUI()
-        else:
-            sys.exit(1)
+        # Salesforce internal id
+        self.eid = None
 
     ########
-    # This function checks if Salesforce credentials are stored in the environment, and attempts to connect to Salesforce if so
+    # This function checks if Salesforce credentials are stored in the environment
     ########
-    def authenticate(self):
+    def check_credentials(self):
+        # a session id can be given instead of a password, e.g. to use a mock Salesforce for testing
+        if os.getenv("SF_BENCH_INSTANCE_URL") and os.getenv("SF_BENCH_SESSION_ID"):
+            return True
+
         # check that username, password, and security tokens all exist as environment variables 
         missing = []
         if not os.getenv("SF_BENCH_USERNAME"):
@@ -153,29 +1928,186 @@ class EquipmentInfo():
             print(f"\033[91mMissing the following environment variables for Salesforce credentials: {missing}\033[00m")
             print("Please see instructions in https://github.com/CMU-IS-Computer-Reach/hardware-info-script/blob/main/README.md")
             return False
+        return True
 
+    ########
+    # This function attempts to connect to Salesforce with the credentials stored in the environment, and returns whether it succeeded
+    # NOTE: It runs in the background (see __init__()); use _wait_for_login() to get its result
+    ########
+    def authenticate(self):
         try:
-            if self._args.test: # use Sandbox connection for test
+            with startup_step("Salesforce login"), trace_span("Salesforce login", "salesforce"):
+                self._connect()
+            return True
+        except Exception as e:
+            print(f"\033[91mError occured when trying to connect to Salesforce: {e}\033[00m")
+            print("Please double check your environment variables SF_BENCH_USERNAME, SF_BENCH_PASSWORD, SF_BENCH_TOKEN, to make sure the correct Salesforce credential is stored; note that security token is automatically updated every time password is changed.")
+            return False
+
+    ########
+    # This function connects to Salesforce, reusing the cached session if there is a valid one, or logging in (and caching the new session) otherwise
+    # The cache is locked while logging in, so when several processes on the same machine need a new session at the same time, only one of them logs in
+    #
+    # NOTE: If SF_BENCH_INSTANCE_URL and SF_BENCH_SESSION_ID are set, that session is used instead, without logging in or caching
+    #       If stale_session_id is given, that session is known to be invalid, so it's not reused even if it's still in the cache
+    ########
+    def _connect(self, stale_session_id=None):
+        Salesforce = import_module("simple_salesforce").Salesforce
+        # the HTTP connections are kept (see SalesforceHttp) when logging in again
+        if self._salesforce_http is None:
+            self._salesforce_http = SalesforceHttp()
+        session = self._salesforce_http.session
+
+        # an existing session (see check_credentials()) is used as is; plain http is allowed here, so that a local mock Salesforce can be used
+        instance_url = os.getenv("SF_BENCH_INSTANCE_URL")
+        if instance_url and os.getenv("SF_BENCH_SESSION_ID"):
+            self.sf = Salesforce(session_id = os.getenv("SF_BENCH_SESSION_ID"), instance_url = instance_url, session = session)
+            if instance_url.startswith("http://"):
+                self.sf.base_url = "http://" + self.sf.base_url[len("https://"):]
+            return
+
+        sandbox = self._args.test
+        username = os.getenv("SF_BENCH_USERNAME")
+        with locked_file(salesforce_session_path(sandbox)):
+            cached = load_salesforce_session(sandbox, username)
+            if cached and cached["session_id"] != stale_session_id:
+                self.sf = Salesforce(session_id = cached["session_id"], instance_url = cached["instance_url"], session = session)
+                return
+
+            if sandbox: # use Sandbox connection for test
                 self.sf = Salesforce(
-                    username = os.getenv("SF_BENCH_USERNAME"), 
+                    username = username, 
                     password = os.getenv("SF_BENCH_PASSWORD"), 
                     security_token = os.getenv("SF_BENCH_TOKEN"),
                     client_id='Hardware Info Script (test)',
                     domain='test',
+                    session = session,
                 )
             else: # production environment
                 self.sf = Salesforce(
-                    username = os.getenv("SF_BENCH_USERNAME"), 
+                    username = username, 
                     password = os.getenv("SF_BENCH_PASSWORD"), 
                     security_token = os.getenv("SF_BENCH_TOKEN"),
                     client_id='Hardware Info Script',
+                    session = session,
                 )
+            save_salesforce_session(sandbox, username, self.sf.session_id, f"https://{self.sf.sf_instance}")
+
+    ########
+    # This function starts logging in to Salesforce in the background, and returns the future of its result (see _wait_for_login())
+    # With --collector, there is nothing to log in to, since the collector talks to Salesforce
+    ########
+    def _start_login(self):
+        if self._args.collector:
+            login = concurrent.futures.Future()
+            login.set_result(True)
+            return login
+        return self._background.submit(self.authenticate)
+
+    ########
+    # This function waits for logging in to Salesforce (started in the background by __init__()) to finish, and returns whether it succeeded
+    ########
+    def _wait_for_login(self):
+        return self._login.result()
+
+    ########
+    # This function starts looking up the Salesforce id of the record with the given CRID in the background; see _lookup_CRID()
+    # Once found, the current values of the record are fetched in the background too, so that only the changed fields are uploaded; see _fetch_record()
+    ########
+    def _start_CRID_lookup(self, cr):
+        self._crid_lookup = self._background.submit(self._lookup_CRID, cr)
+        self._record_fetch = self._background.submit(self._fetch_record, self._crid_lookup)
+
+    ########
+    # This function returns the current values (a dictionary of field API names to values, including SystemModstamp) of the record found by
+    #   the given CRID lookup (a future of _lookup_CRID()), or None if there is no such record, or it cannot be fetched (e.g. with --collector)
+    ########
+    def _fetch_record(self, crid_lookup):
+        eid = crid_lookup.result()
+        if not eid or self._args.collector or not self._wait_for_login():
+            return None
+        fields = ",".join(["SystemModstamp"] + list(ALL_FIELDS_API_NAMES.values()))
+        try:
+            with trace_span("fetch record", "salesforce"):
+                return self._call_salesforce(lambda sf: sf.restful(f"sobjects/Equipment__c/{eid}", params = {"fields": fields}))
+        except Exception:
+            return None
+
+    ########
+    # This function returns the Salesforce id of the record with the given CRID, or None if there is no such record (or we're not logged in)
+    # The CRID is looked up in the local CRID index first; Salesforce is only asked directly if the index could not be synced
+    # With --collector, the collector is asked instead
+    ########
+    def _lookup_CRID(self, cr):
+        with trace_span("CRID lookup", "crid", crid = cr) as span:
+            eid = self._lookup_CRID_from(cr, span)
+            span.set(found = bool(eid))
+            return eid
+
+    def _lookup_CRID_from(self, cr, span):
+        eid = self._crid_index.lookup(cr)
+        if eid:
+            span.set(source = "index")
+            return eid
+
+        if self._args.collector:
+            span.set(source = "collector")
+            try:
+                status, body = collector_request(self._args.collector, "GET", "/crids/" + urllib.parse.quote(cr, safe = ""))
+            except OSError:
+                return None
+            return body["Id"] if status == 200 else None
+
+        # the record may have been added since the index was last synced
+        if self._crid_index_sync.result():
+            span.set(source = "synced index")
+            return self._crid_index.lookup(cr)
+
+        if not self._wait_for_login():
+            return None
+        span.set(source = "salesforce")
+        try:
+            return self._call_salesforce(lambda sf: sf.Equipment__c.get_by_custom_id(ALL_FIELDS_API_NAMES["CRID"], cr))['Id']
+        except Exception:
+            return None
+
+    ########
+    # This function brings the local CRID index up to date with Salesforce (see CridIndex), and returns whether it succeeded
+    # NOTE: It runs in the background (see __init__()); the index file is locked while syncing, since other processes on this machine share it
+    ########
+    def _sync_CRID_index(self):
+        if self._args.collector or not self._wait_for_login():
+            return False
+        path = crid_index_path(self._args.test)
+        try:
+            with trace_span("CRID index sync", "salesforce"), locked_file(path):
+                # another process may have synced the file since it was loaded
+                index = CridIndex.load(path)
+                if (index.synced_at or "") > (self._crid_index.synced_at or ""):
+                    self._crid_index = index
+                # the records are fetched inside the call, since query_all_iter() only queries Salesforce when iterated over,
+                #   which would be too late for _call_salesforce() to log in again if the session has expired
+                self._crid_index.sync(lambda soql, include_deleted: self._call_salesforce(lambda sf: list(sf.query_all_iter(soql, include_deleted = include_deleted))))
+                self._crid_index.save(path)
             return True
-        except Exception as e:
-            print(f"\033[91mError occured when trying to connect to Salesforce: {e.message}\033[00m")
-            print("Please double check your environment variables SF_BENCH_USERNAME, SF_BENCH_PASSWORD, SF_BENCH_TOKEN, to make sure the correct Salesforce credential is stored; note that security token is automatically updated every time password is changed.")
+        except Exception:
             return False
 
+    ########
+    # This function makes a call to Salesforce, where call is a function that takes the Salesforce connection and makes the call, e.g.
+    #   self._call_salesforce(lambda sf: sf.Equipment__c.get_by_custom_id(...))
+    # If the cached session turns out to be invalid (expired, or ended by a password change), it logs in again and retries the call once
+    ########
+    def _call_salesforce(self, call):
+        exceptions = import_module("simple_salesforce.exceptions")
+        # the connection is kept, since another thread may log in again (replacing self.sf) while the call is made, and its new session is not stale
+        sf = self.sf
+        try:
+            return call(sf)
+        except exceptions.SalesforceExpiredSession:
+            self._connect(stale_session_id = sf.session_id)
+            return call(self.sf)
+
     ########
     # This function handles the section where users are asked to manually input data for all fields listed in self.manual_fields
     #
@@ -185,29 +2117,23 @@ class EquipmentInfo():
     ########
     def data_input(self):
         print()
+        startup_mark("first prompt")
         print("\033[104m***Manual Data Entry Section***\033[00m")
         print("\033[93mAfter each prompt, enter value and press ENTER, or directly press ENTER to skip\033[00m")
         cnt = len(self.manual_fields)
         i = 1
 
         # input CRID (required)
-        while True:
-            cr = input(f" ({i:02d}/{cnt:02d}) [REQUIRED] Enter CRID: ")
-            if not cr:
-                print("\033[91m  CRID is required\033[00m")
-            else:
-                try:
-                    self.eid = self.sf.Equipment__c.get_by_custom_id(ALL_FIELDS_API_NAMES["CRID"], cr)['Id']
-                    self.CRID = cr
-                    break
-                except:
-                    print(f"\033[91m  There is no record with CRID {cr} in Salesforce, please double check and reenter\033[00m")
-                    print("\033[93m  (if you are trying to create a new equipment record, please add it from Salesforce UI first)\033[00m")
+        # its Salesforce record is looked up in the background while the remaining fields are entered, and confirmed in confirm_CRID()
+        self._CRID_fn(i)
         i += 1
 
         # input the remaining manual fields
         # functions handling taking input and validating it for each field are further below
         for field in self.manual_fields[1:]:
+            # stop early if logging in failed, rather than after all the fields are entered
+            if self._login.done() and not self._wait_for_login():
+                sys.exit(1)
             try:
                 getattr(self, f"_{field}_fn")(i)
             except:
@@ -216,117 +2142,229 @@ class EquipmentInfo():
 
         print()
 
+    ########
+    # This function waits for the Salesforce record of the entered CRID to be found (see _start_CRID_lookup()), and stores its id in self.eid
+    # If there is no record with that CRID, the user is asked to reenter it until one is found
+    ########
+    def confirm_CRID(self):
+        if not self._wait_for_login():
+            sys.exit(1)
+        while True:
+            self.eid = self._crid_lookup.result()
+            if self.eid:
+                break
+            print(f"\033[91m  There is no record with CRID {self.CRID} in Salesforce, please double check and reenter\033[00m")
+            similar = self._crid_index.search(self.CRID)
+            if similar:
+                print(f"\033[93m  (CRIDs starting with {self.CRID}: {', '.join(similar)})\033[00m")
+            print("\033[93m  (if you are trying to create a new equipment record, please add it from Salesforce UI first)\033[00m")
+            self._CRID_fn()
+        print()
+
     ########
     # This function handles the section where all fields listed in self.auto_fields are collected automatically by running Linux commands
     #
-    # NOTE: If a new field is to be added, MUST add the corresponding Linux command to AUTO_FIELDS_LINUX_COMMANDS
-    #       Each section in this function handles a single field; refer to their structure if you are adding a new field
+    # All collectors run concurrently on a thread pool, so the wall time of this section is roughly that of the slowest collector
+    # Each field is displayed as soon as its collector finishes; values and errors are then stored in the order of self.auto_fields,
+    #   so that self._errors is the same regardless of which collector finished first
+    #
+    # NOTE: If a new field is to be added, a collector function named _xxx_collector MUST be added (if the new field is called xxx)
+    #       If the collector runs Linux commands, add them to AUTO_FIELDS_LINUX_COMMANDS; if it only reads a file under /proc, prefer a native reader (see read_cpu_model())
+    #       Scroll down for functions under the comment "data collection functions for auto fields" as a reference
+    # If on_result is given, it's also called with (field, value, error) as soon as each field is collected (see collect_auto_fields()), e.g. by the GUI
     ########
-    def data_collection(self):
+    def data_collection(self, on_result=None):
         print("\033[104m***Auto Data Collection Section***\033[00m")
+        def display(field, val, err):
+            self._display_auto_field(field, val, err)
+            if on_result:
+                on_result(field, val, err)
+        self.collect_auto_fields(display)
+        if self._cached_fields:
+            print(f"\033[93m({len(self._cached_fields)} field(s) reused from an earlier run on this machine; choose R in the review section to collect them again)\033[00m")
+        print()
+        self._display_errors()
 
-        # CPU model
+    ########
+    # This function waits for all the collectors to finish (starting them first if they aren't running), and stores their values and errors
+    # A field whose collector runs longer than AUTO_FIELD_TIMEOUT, or is not done by the deadline of the collection (see AUTO_FIELDS_DEADLINE),
+    #   is given up on with the error "timed out after Xs", and the other fields are kept
+    # If on_result is given, it's called with (field, value, error) as soon as each collector finishes, e.g. to display the field right away
+    ########
+    def collect_auto_fields(self, on_result=None):
+        # collectors are normally started in the background by __init__(); start them now if they aren't
+        self.start_collection()
+        collection, self._collection = self._collection, None
+
+        results = dict()
+        pending = set(collection)
+        while pending:
+            # give up on the fields that are out of time; the others are waited for until the next one runs out of time
+            now = time.monotonic()
+            for future in [future for future in pending if not future.done() and self._collector_expiry(collection[future]) <= now]:
+                pending.discard(future)
+                future.cancel()
+                field = collection[future]
+                started = self._collector_started.get(field, self._collection_started)
+                results[field] = (None, f"timed out after {now - started:.0f}s")
+                self._collector_times[field] = now - started
+                if on_result:
+                    on_result(field, *results[field])
+            if not pending:
+                break
+            timeout = max(0, min(self._collector_expiry(collection[future]) for future in pending) - now)
+            done, _ = concurrent.futures.wait(pending, timeout = timeout, return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                field = collection[future]
+                try:
+                    val, err = future.result()
+                except Exception as e:
+                    val, err = None, f"unexpected error in collector ({e})"
+                results[field] = (val, err)
+                if on_result:
+                    on_result(field, val, err)
+
+        for field in self.auto_fields:
+            val, err = results[field]
+            if err:
+                self._errors[field] = err
+            else:
+                setattr(self, field, val)
+        self._save_field_cache(results)
         try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["model_name"]), 
-                shell = True,
-                text = True,
-                stderr = subprocess.STDOUT)
-        except subprocess.CalledProcessError as e:
-            self._errors["model name"] = e.output if e.output else "`grep` didn't find match (unexpected /proc/cpuinfo file format)"
-        else:
-            try:
-                r = re.match(r"\s*model name\s*:\s*(.*)", output)
-                self.model_name = r.group(1)
-            except Exception as e:
-                self._errors["model name"] = "regex matching error (unexpected /proc/cpuinfo file format)"
+            save_collector_costs(dict(self._collector_times))
+        except OSError:
+            pass
 
-        # RAM size (GB)
-        try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["RAM"]),
-                shell = True,
-                text = True,
-                stderr = subprocess.STDOUT)
-        except subprocess.CalledProcessError as e:
-            self._errors["RAM"] = e.output if e.output else "`grep` didn't find match (unexpected /proc/meminfo file format)"
-        else:
-            try:
-                r = re.match(r"(\d+)G", output)
-                self.RAM = int(r.group(1))
-            except Exception as e:
-                self._errors["RAM"] = "regex matching error (unexpected /proc/meminfo file format)"
-        
-        # Screen size (inch)
-        try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["screen_size"]),
-                shell = True,
-                text = True)
-        except subprocess.CalledProcessError as e:
-            self._errors["screen size"] = e.output if e.output else "`grep` didn't find match (`xrandr` cannot find current display device)"
-        else:
-            try:
-                r = re.match(r".*\s+(\d+)mm\s+x\s+(\d+)mm", output)
-                w = int(r.group(1))
-                h = int(r.group(2))
-                diagonal = (w * w + h * h) ** 0.5
-                self.screen_size = round(diagonal / 25.4)
-            except Exception as e:
-                self._errors["screen size"] = "regex matching error (unexpected output format from `xrandr`)"
-                
-        # Battery health (%)
-        try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["battery_health"]),
-                shell = True,
-                text = True)
-        except subprocess.CalledProcessError as e:
-            self._errors["battery health"] = e.output if e.output else "`grep` didn't find match (battery information not found by `upower`)"
-        else:
-            try:
-                r = re.match(r"([\d\.]*)%", output)
-                self.battery_health = round(float(r.group(1)), 2)
-            except Exception as e:
-                self._errors["battery health"] = "regex matching error (unexpected output format from `upower`)"
-        
-        # Ethernet
-        try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["has_ethernet"]),
-                shell = True,
-                text = True)
-        except subprocess.CalledProcessError as e:
-            self.has_ethernet = False
+    ########
+    # This function returns the time (a time.monotonic() value) by which the collector of the given field must be done:
+    #   AUTO_FIELD_TIMEOUT after it started, but no later than the deadline of the collection
+    ########
+    def _collector_expiry(self, field):
+        deadline = self._collection_started + AUTO_FIELDS_DEADLINE
+        started = self._collector_started.get(field)
+        return deadline if started is None else min(started + AUTO_FIELD_TIMEOUT, deadline)
+
+    def _display_auto_field(self, field, val, err):
+        if err:
+            print(f"\033[91m - {field:<20}: (error)\033[00m")
+        elif val != None:
+            print(f" - {field:<20}: {val}")
         else:
-            self.has_ethernet = True
+            print(f" - {field:<20}: (empty)")
 
-        # WiFi
-        try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["has_wifi"]),
-                shell = True,
-                text = True)
-        except subprocess.CalledProcessError as e:
-            self.has_wifi = False
-        else:
-            self.has_wifi = True
+    ########
+    # This function collects all the auto fields again, reading every source of hardware information again (e.g. after plugging in a battery or a display),
+    #   and displays them like data_collection() does; values entered for auto fields in the review are replaced
+    ########
+    def refresh_auto_fields(self):
+        self._sources.invalidate()
+        for field in self.auto_fields:
+            self._errors.pop(field, None)
+        self.start_collection(use_cache = False)
+        self.data_collection()
 
-        # Optical drive
-        try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["has_optical_drive"]),
-                shell = True,
-                text = True)
-        except subprocess.CalledProcessError as e:
-            self.has_optical_drive = False
-        else:
-            self.has_optical_drive = True
+    ########
+    # This function starts all the collectors of the auto fields on a few threads, without waiting for them to finish
+    # The results are gathered by collect_auto_fields()
+    # Up to AUTO_FIELDS_WORKERS collectors run at the same time, starting with the ones that took the least time in earlier runs (see load_collector_costs()),
+    #   so that a slow collector cannot keep the quick ones from finishing before the deadline
+    # Fields collected by an earlier run on this machine since it was started are reused instead, unless their source changed since then
+    #   (see AUTO_FIELDS_HOTPLUG_SOURCES), use_cache is False, or the script is run with --no-cache
+    # NOTE: The threads are daemon threads rather than those of a ThreadPoolExecutor, which Python waits for when exiting: a collector stuck in Python
+    #       (unlike its Linux commands, it cannot be killed) is given up on by collect_auto_fields(), and must not keep the script from exiting
+    ########
+    def start_collection(self, use_cache=True):
+        if self._collection is not None:
+            return
+        # the sources are checked before collecting, so that a device plugged in while collecting makes the next run collect the field again
+        self._field_signatures = {field: hotplug_signature(field) for field in self.auto_fields}
+        cached = self._load_field_cache() if use_cache and not self._args.no_cache else dict()
+        self._cached_fields = set(cached)
+
+        costs = load_collector_costs()
+        self._collection_generation += 1
+        generation = self._collection_generation
+        self._collection_started = time.monotonic()
+        self._collector_started = dict()     # field -> time (time.monotonic()) its collector started
+        self._collector_times = dict()       # field -> seconds its collector took (see save_collector_costs())
+        self._collection = dict()
+        queue = []                           # (future, field) of the collectors to run, cheapest first
+        for field in sorted(self.auto_fields, key = lambda field: costs.get(field, 0)):
+            future = concurrent.futures.Future()
+            if field in cached:
+                future.set_result((cached[field], None))
+            else:
+                queue.append((future, field))
+            self._collection[future] = field
 
-        # Touchscreen
+        lock = threading.Lock()
+        def run_collectors():
+            while True:
+                with lock:
+                    if not queue or generation != self._collection_generation: # the collection was given up on (see next_unit())
+                        return
+                    future, field = queue.pop(0)
+                if not future.set_running_or_notify_cancel(): # given up on before it started
+                    continue
+                try:
+                    future.set_result(self._run_collector(field, generation))
+                except BaseException as e:
+                    future.set_exception(e)
+        for i in range(min(AUTO_FIELDS_WORKERS, len(queue))):
+            threading.Thread(target = run_collectors, name = f"collector_{i}", daemon = True).start()
+
+    ########
+    # These functions read and update the field cache (see load_field_cache()):
+    #   - _load_field_cache(): returns the values (a dictionary mapping field to value) of the cached fields whose source has not changed since
+    #     they were collected (i.e. whose signature is still the one in self._field_signatures)
+    #   - _save_field_cache(): saves the fields collected without error, given the results (a dictionary mapping field to (value, error))
+    # NOTE: The field cache is only used if this machine can be identified (see machine_fingerprint()); failing to write it is not an error
+    ########
+    def _load_field_cache(self):
+        with trace_span("field cache", "cache") as span:
+            fingerprint = machine_fingerprint()
+            if fingerprint is None:
+                return dict()
+            cache = load_field_cache(fingerprint)
+            cached = {field: cache[field]["value"] for field in self.auto_fields
+                      if isinstance(cache.get(field), dict) and cache[field].get("signature") == self._field_signatures[field]}
+            span.set(cached = len(cached))
+            return cached
+
+    def _save_field_cache(self, results):
+        fingerprint = machine_fingerprint()
+        if fingerprint is None:
+            return
+        fields = {field: {"value": val, "signature": self._field_signatures[field]} for field, (val, err) in results.items() if not err}
         try:
-            output = subprocess.check_output((" | ").join(AUTO_FIELDS_LINUX_COMMANDS["has_touchscreen"]),
-                shell = True,
-                text = True)
-        except subprocess.CalledProcessError as e:
-            self.has_touchscreen = False
-        else:
-            self.has_touchscreen = True
+            save_field_cache(fingerprint, fields)
+        except OSError:
+            pass
 
-        self._display_errors()
+    ########
+    # This function runs the collector of the given auto field, and returns its result (value, error)
+    # The Linux commands it runs are killed if they are still running when the collector is out of time (see _collector_expiry() and command_deadline())
+    # generation is that of the collection it belongs to (see start_collection()): a collector still running when a newer collection starts
+    #   (e.g. one stuck on the previous unit in the bench station mode) does not record anything about itself in the newer one
+    ########
+    def _run_collector(self, field, generation):
+        started = time.monotonic()
+        # the state of the collection is taken once, since the attributes are replaced when a newer collection starts
+        collector_started, collector_times = self._collector_started, self._collector_times
+        if generation != self._collection_generation:
+            return None, "given up on (a newer collection started)"
+        collector_started[field] = started
+        with trace_span(f"collect {field}", "collector", field = field) as span, command_deadline(self._collector_expiry(field)):
+            try:
+                val, err = getattr(self, f"_{field}_collector")()
+            except subprocess.TimeoutExpired:
+                val, err = None, f"timed out after {time.monotonic() - started:.0f}s"
+            if generation == self._collection_generation:
+                collector_times[field] = time.monotonic() - started
+            span.set(error = err)
+            return val, err
 
     ########
     # This function handles the section where users can review the current data and modify any fields if necessary
@@ -359,13 +2397,17 @@ class EquipmentInfo():
                         print(f" [{idx:>2}] {field:<20}: (empty)")
 
             # allow user to choose a field they want to modify
-            choice = input(f" *Enter integet option if you want to modify any field, or Y to proceed to data upload:").lower()
+            choice = input(f" *Enter integet option if you want to modify any field, R to collect the automatic fields again, or Y to proceed to data upload:").lower()
             if not choice:
                 print("\033[91m  Please enter a valid integer option, or Y to proceed\033[00m")
                 updated = False
             elif choice == "y":
                 print()
                 break
+            elif choice == "r":
+                print()
+                self.refresh_auto_fields()
+                updated = True
             else:
                 try:
                     choice = int(choice)
@@ -436,21 +2478,533 @@ class EquipmentInfo():
         while True:
             res = input(f"\033[44mUpload to Salesforce? [y/n]: \033[00m").lower()
             if res == "y":
-                record = self._convert_to_record()
-                try:
-                    self.sf.Equipment__c.update(self.eid, record)
+                status, error = self.upload_record()
+                if status == "sent":
                     print(f"\033[92mData uploaded successfully! CRID: {self.CRID}\033[00m")
-                except:
-                    print(f"\033[91mUnexpected error, likely that record with CRID {self.CRID} is recently deleted from Salesforce\033[00m")
+                elif status == "pending":
+                    print(f"\033[93mSalesforce cannot be reached right now ({error}); data is saved locally, and will be uploaded the next time the script runs\033[00m")
+                    print(f"\033[93m(to upload it sooner, run: python3 {sys.argv[0]} flush)\033[00m")
+                else:
+                    print(f"\033[91mSalesforce did not accept the data of CRID {self.CRID} ({error})\033[00m")
                     print("\033[90mData not uploaded.\033[00m")
-                finally:
-                    break
+                break
             elif res == "n":
                 print("\033[90mData not uploaded.\033[00m")
                 break
             else:
                 print("\033[91m  Please enter a valid option [y/n]\033[00m")
 
+    ########
+    # This function runs the whole audit without asking anything: the manual fields are taken from --manifest and --set, the review is skipped,
+    #   and the data is uploaded right away; this way a single manifest can be used for a whole cart of identical machines
+    # The result is written as JSON to --result, and the exit code of the script (see EXIT_XXX) is returned
+    # NOTE: All other messages are printed to stderr, so that standard output can be used for the result
+    ########
+    def run_unattended(self):
+        result = {"CRID": None, "status": None, "errors": dict()}
+        with contextlib.redirect_stdout(sys.stderr), trace_span("run_unattended", "stage"):
+            exit_code = self._run_unattended(result)
+        output = json.dumps(result, indent = 2, default = str)
+        if self._args.result == "-":
+            print(output)
+        else:
+            with open(self._args.result, "w") as f:
+                f.write(output + "\n")
+        return exit_code
+
+    def _run_unattended(self, result):
+        # fill in the manual fields
+        try:
+            values = self._read_manifest()
+        except ValueError as e:
+            result["status"] = "invalid"
+            result["errors"]["manifest"] = str(e)
+            return EXIT_INVALID
+        for field, value in values.items():
+            try:
+                setattr(self, field, self._parse_manual_field(field, value))
+            except ValueError as e:
+                result["errors"][field] = str(e)
+        result["CRID"] = self.CRID
+        if not self.CRID:
+            result["errors"]["CRID"] = "CRID is required"
+        if result["errors"]:
+            result["status"] = "invalid"
+            return EXIT_INVALID
+
+        # check the CRID, and wait for the auto fields
+        self._start_CRID_lookup(self.CRID)
+        if not self._wait_for_login():
+            result["status"] = "login_failed"
+            return EXIT_ERROR
+        self.eid = self._crid_lookup.result()
+        if not self.eid:
+            result["status"] = "unknown_CRID"
+            result["errors"]["CRID"] = f"there is no record with CRID {self.CRID} in Salesforce"
+            return EXIT_INVALID
+        self.collect_auto_fields()
+        result["errors"].update(self._errors)
+        result["fields"] = {field: getattr(self, field) for field in self.manual_fields + self.auto_fields}
+        result["record"] = self._convert_to_record()
+
+        status, error = self.upload_record()
+        result["status"] = {"sent": "uploaded", "pending": "queued"}.get(status, "upload_failed")
+        if error:
+            result["errors"]["upload"] = error
+        if status == "sent":
+            return EXIT_UPLOADED
+        return EXIT_QUEUED if status == "pending" else EXIT_ERROR
+
+    ########
+    # This function returns the manual field values (a dictionary mapping field name to value) given with --manifest and --set
+    # The manifest is a JSON object (or YAML mapping, if PyYAML is installed) mapping field names to values, e.g.
+    #   {"has_webcam": true, "video_ports": ["HDMI", "VGA"], "num_usb_ports": 3, "final_os": "20.04_Xubuntu_Linux"}
+    # NOTE: Raises ValueError if the manifest cannot be read, or mentions a field that is not a manual field
+    ########
+    def _read_manifest(self):
+        values = dict()
+        if self._args.manifest:
+            yaml = None
+            if self._args.manifest.endswith((".yaml", ".yml")):
+                try:
+                    yaml = import_module("yaml")
+                except ImportError:
+                    raise ValueError("PyYAML is needed to read YAML manifests (pip install pyyaml), or use a JSON manifest instead")
+            try:
+                with open(self._args.manifest) as f:
+                    values = yaml.safe_load(f) if yaml else json.load(f)
+            except OSError as e:
+                raise ValueError(f"cannot read {self._args.manifest} ({e.strerror})")
+            except Exception as e: # json.JSONDecodeError or yaml.YAMLError
+                raise ValueError(f"cannot parse {self._args.manifest} ({e})")
+            if not isinstance(values, dict):
+                raise ValueError(f"{self._args.manifest} should map field names to values")
+
+        for assignment in self._args.set:
+            field, sep, value = assignment.partition("=")
+            if not sep:
+                raise ValueError(f"--set {assignment}: expected FIELD=VALUE")
+            values[field.strip()] = value
+
+        unknown = [field for field in values if field not in self.manual_fields]
+        if unknown:
+            raise ValueError(f"unknown manual field(s) {unknown}; manual fields are {self.manual_fields}")
+        return values
+
+    ########
+    # This function validates a manual field value given in a manifest or with --set, and returns it converted to the type of the field
+    # The rules are the same as when the field is entered interactively (see the _xxx_fn functions below)
+    # NOTE: Raises ValueError, with a message describing the problem, if the value is not valid
+    #       If a new manual field is to be added, MUST add the validation of its value here too
+    ########
+    def _parse_manual_field(self, field, value):
+        if field == "CRID" or field == "adapter_watts":
+            value = str(value).strip()
+            if not value:
+                raise ValueError("should not be empty")
+            return value
+        elif field == "has_webcam":
+            if isinstance(value, bool):
+                return value
+            if str(value).lower() in ("y", "yes", "true", "1"):
+                return True
+            if str(value).lower() in ("n", "no", "false", "0", ""):
+                return False
+            raise ValueError("should be y or n")
+        elif field == "video_ports":
+            ports = value if isinstance(value, list) else [port.strip() for port in re.split(r"[;,]", str(value)) if port.strip()]
+            invalid = [port for port in ports if port not in VIDEO_PORT_OPTIONS]
+            if invalid:
+                raise ValueError(f"unknown video port(s) {invalid}; options are {VIDEO_PORT_OPTIONS}")
+            return [port for port in VIDEO_PORT_OPTIONS if port in ports]
+        elif field == "num_usb_ports":
+            # only whole numbers are accepted: int() would also turn 3.7 into 3, and accept " 3 "
+            if isinstance(value, int) and not isinstance(value, bool):
+                usb = value
+            elif isinstance(value, float) and value.is_integer():
+                usb = int(value)
+            elif isinstance(value, str) and re.fullmatch(r"[0-9]+", value):
+                usb = int(value)
+            else:
+                usb = -1
+            if usb < 0 or usb > 99:
+                raise ValueError("should be an integer between 0 and 99")
+            return usb
+        elif field == "final_os":
+            if value not in FINAL_OS_OPTIONS:
+                raise ValueError(f"should be one of {FINAL_OS_OPTIONS}")
+            return value
+        elif field == "storage":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                raise ValueError("should be a number (GB)")
+        raise ValueError("unhandled manual field; please contact administrator to update the script")
+
+    ########
+    # This function saves the current data to the upload spool, and then tries to send it (together with any other pending records) to Salesforce
+    # If the current values of the record in Salesforce could be fetched (see _fetch_record()), only the fields that changed are saved, and they are
+    #   only updated if the record was not modified in Salesforce in the meantime (e.g. by someone in the Salesforce UI); nothing is sent if no field changed
+    # Returns a tuple (status, error), where status is the status of the record in the spool (see UploadSpool), and error the last error (or None)
+    ########
+    def upload_record(self):
+        with trace_span("upload", "upload", crid = self.CRID) as span:
+            record = self._convert_to_record()
+            current = self._record_fetch.result() if self._record_fetch is not None else None
+            if current is not None:
+                record = record_changes(record, current)
+                span.set(changed_fields = len(record))
+            spool_id = self._spool.add(self.CRID, self.eid, record, current["SystemModstamp"] if current is not None else None)
+            self._flush_spool()
+            row = self._spool.get(spool_id)
+            span.set(status = row["status"])
+            return row["status"], row["last_error"]
+
+    ########
+    # This function handles the "flush" command: it logs in, sends all pending records in the upload spool, and returns the exit code of the script
+    # (0 if nothing is left to upload, 1 otherwise)
+    # NOTE: Records waiting to be retried after a failed upload are sent right away too, since the command is typically run once the network is back
+    ########
+    def flush_uploads(self):
+        self._login = concurrent.futures.Future()
+        self._login.set_result(bool(self._args.collector) or self.authenticate())
+        sent = self._flush_spool(force = True)
+        counts = self._spool.counts()
+        print(f"{sent} record(s) uploaded; {counts.get('pending', 0)} still pending, {counts.get('failed', 0)} failed")
+        return 0 if self._login.result() and not counts.get("pending") else 1
+
+    ########
+    # This function sends the pending records in the upload spool to Salesforce (or to the collector, with --collector), and returns the number of records sent
+    # If force is True, the records waiting to be retried are sent too (see UploadSpool.flush())
+    ########
+    def _flush_spool(self, force=False):
+        if not self._wait_for_login():
+            return 0
+        return self._spool.flush(self._send_to_collector if self._args.collector else self._update_records, force = force)
+
+    ########
+    # These functions send a batch of records from a spool (a list of (record id, record, modstamp), see UploadSpool.flush()), and return one result per record
+    #   - _update_records(): updates the records by their record id; records with no changes are not sent at all, records with a modstamp are sent
+    #     with Salesforce's Composite API, each guarded by If-Unmodified-Since (see _update_records_unless_modified()),
+    #     and the others with Salesforce's sObject Collections API, which takes more records per request
+    #     Each request is sent on its own: if one fails (e.g. it times out), only its records are retried later, since the others were updated
+    #   - _upsert_records(): upserts the records by their CRID (external id), with Salesforce's sObject Collections API; used by the collector
+    #   - _send_to_collector(): sends the records to the collector
+    ########
+    def _update_records(self, records):
+        results = [{"success": True} if not payload else None for record_id, payload, modstamp in records]
+        guarded = [i for i, (record_id, payload, modstamp) in enumerate(records) if payload and modstamp]
+        unguarded = [i for i, (record_id, payload, modstamp) in enumerate(records) if payload and not modstamp]
+
+        for start in range(0, len(guarded), COMPOSITE_MAX_SUBREQUESTS):
+            chunk = guarded[start:start + COMPOSITE_MAX_SUBREQUESTS]
+            try:
+                response = self._update_records_unless_modified([records[i] for i in chunk])
+            except Exception as e:
+                response = [{"success": False, "retry": True, "errors": [{"message": str(e) or type(e).__name__}]}] * len(chunk)
+            for i, result in zip(chunk, response):
+                results[i] = result
+
+        if unguarded:
+            body = {"allOrNone": False, "records": [dict(records[i][1], attributes = {"type": "Equipment__c"}, id = records[i][0]) for i in unguarded]}
+            try:
+                with trace_span("Salesforce update", "salesforce", records = len(unguarded)):
+                    response = self._call_salesforce(lambda sf: sf.restful("composite/sobjects", method = "PATCH", json = body))
+            except Exception as e:
+                response = [{"success": False, "retry": True, "errors": [{"message": str(e) or type(e).__name__}]}] * len(unguarded)
+            for i, result in zip(unguarded, response):
+                results[i] = result
+        return results
+
+    ########
+    # This function updates up to COMPOSITE_MAX_SUBREQUESTS records in a single request to Salesforce's Composite API, each only if it has not been modified
+    #   in Salesforce since its modstamp, and returns one result per record, in the same format as the sObject Collections API
+    # A record modified since is fetched again: if it already has the values being uploaded (e.g. they were uploaded by an earlier attempt whose answer
+    #   was lost), the update counts as done; otherwise someone else changed it, and it must be reviewed
+    ########
+    def _update_records_unless_modified(self, records):
+        def subrequests(sf):
+            return [{
+                "method": "PATCH",
+                "url": f"/services/data/v{sf.sf_version}/sobjects/Equipment__c/{record_id}",
+                "referenceId": f"record{i}",
+                "body": payload,
+                "httpHeaders": {"If-Unmodified-Since": http_date(modstamp)},
+            } for i, (record_id, payload, modstamp) in enumerate(records)]
+        with trace_span("Salesforce update", "salesforce", records = len(records), guarded = True):
+            response = self._call_salesforce(lambda sf: sf.restful("composite", method = "POST", json = {"allOrNone": False, "compositeRequest": subrequests(sf)}))
+
+        results = []
+        for (record_id, payload, modstamp), subresponse in zip(records, response["compositeResponse"]):
+            status = subresponse["httpStatusCode"]
+            if 200 <= status < 300:
+                results.append({"success": True})
+            elif status == 412:
+                try:
+                    with trace_span("fetch record", "salesforce"):
+                        current = self._call_salesforce(lambda sf: sf.restful(f"sobjects/Equipment__c/{record_id}", params = {"fields": ",".join(payload)}))
+                except Exception as e:
+                    results.append({"success": False, "retry": True, "errors": [{"message": str(e) or type(e).__name__}]})
+                    continue
+                if record_changes(payload, current):
+                    results.append({"success": False, "errors": [{"message": "the record was modified in Salesforce after it was read; review it and upload again"}]})
+                else:
+                    results.append({"success": True})
+            else:
+                body = subresponse.get("body")
+                results.append({"success": False, "errors": body if isinstance(body, list) else [{"message": f"HTTP {status}"}]})
+        return results
+
+    def _upsert_records(self, records):
+        # only records already in Salesforce are upserted, so that none is created (e.g. if it was deleted after the collector received it)
+        results = [None if self._crid_index.lookup(payload[ALL_FIELDS_API_NAMES["CRID"]]) else
+            {"success": False, "errors": [{"message": f"there is no record with CRID {payload[ALL_FIELDS_API_NAMES['CRID']]} in Salesforce"}]}
+            for record_id, payload, modstamp in records]
+        known = [i for i, result in enumerate(results) if result is None]
+        if known:
+            body = {"allOrNone": False, "records": [dict(records[i][1], attributes = {"type": "Equipment__c"}) for i in known]}
+            with trace_span("Salesforce upsert", "salesforce", records = len(known)):
+                response = self._call_salesforce(lambda sf: sf.restful(f"composite/sobjects/Equipment__c/{ALL_FIELDS_API_NAMES['CRID']}", method = "PATCH", json = body))
+            for i, result in zip(known, response):
+                results[i] = result
+        return results
+
+    def _send_to_collector(self, records):
+        with trace_span("collector upload", "upload", records = len(records)):
+            status, body = collector_request(self._args.collector, "POST", "/records", [payload for record_id, payload, modstamp in records])
+        if status != 200:
+            raise OSError(f"collector answered with HTTP {status}: {body}")
+        return body
+
+    ########
+    # This function handles the "import" command: it uploads the saved audit results in a directory (see read_audit_results()) to Salesforce,
+    #   and returns the exit code of the script (0 if all the records were imported, 1 otherwise)
+    # The records are written to CSV files of up to BULK_CHUNK_ROWS records, each submitted as an ingest job of Salesforce's Bulk API 2.0
+    #   (upserting by CRID, or updating by record id with --operation update) as soon as it's full; once all are submitted, the jobs are waited for,
+    #   and the records that could not be imported (by Salesforce, because their file is not valid, or because their job could not be submitted
+    #   or checked) are written to the --failures file
+    # A unit audited several times has several results: only the newest one (by modification time) of each CRID is imported, so that an older
+    #   result never overwrites a newer one, and a job never has the same record twice
+    # NOTE: Only one chunk is kept at a time (on disk), and only the CRID and file name of the newest result of each CRID are kept in memory
+    ########
+    def import_records(self):
+        self._login = concurrent.futures.Future()
+        self._login.set_result(self.authenticate())
+        if not self._login.result():
+            return 1
+        update = self._args.operation == "update"
+        if update: # record ids are looked up in the CRID index
+            self._crid_index = CridIndex.load(crid_index_path(self._args.test))
+            if not self._sync_CRID_index():
+                print("\033[91mCould not download the CRIDs of the records in Salesforce, which are needed to update them\033[00m")
+                return 1
+        columns = (["Id"] if update else []) + list(ALL_FIELDS_API_NAMES.values())
+
+        newest = dict()                  # CRID -> (modification time, file name) of its newest result
+        for name, crid, record, error in read_audit_results(self._args.directory):
+            if crid:
+                try:
+                    version = (os.stat(os.path.join(self._args.directory, name)).st_mtime, name)
+                except OSError:
+                    continue
+                newest[crid] = max(newest.get(crid, version), version)
+
+        jobs = []                        # (job id, number of records) of the submitted jobs
+        read = 0
+        superseded = 0
+        failed = 0
+        csv = import_module("csv")
+        tempfile = import_module("tempfile")
+        with open(self._args.failures, "w", newline = "") as failures_file, tempfile.TemporaryDirectory(prefix = "hardware-info-import-") as tmp:
+            failures = csv.writer(failures_file)
+            failures.writerow(["CRID", "error", "source"])
+
+            # submits the chunk of records from the given sources (a list of (CRID, file name)), and returns the number of records that failed:
+            #   if the job cannot be submitted, all of them are written to the failures file, and the other chunks are still submitted
+            chunk_path = os.path.join(tmp, "chunk.csv")
+            def submit(sources):
+                try:
+                    jobs.append((self._submit_bulk_job(chunk_path, len(sources)), len(sources)))
+                    return 0
+                except Exception as e:
+                    print(f"\033[91mCould not submit a job of {len(sources)} record(s): {e}\033[00m")
+                    for crid, name in sources:
+                        failures.writerow([crid, f"not submitted to Salesforce ({e})", name])
+                    return len(sources)
+
+            chunk, sources = None, []
+            for name, crid, record, error in read_audit_results(self._args.directory):
+                read += 1
+                if crid and crid in newest and newest[crid][1] != name:
+                    superseded += 1
+                    continue
+                if update and record is not None:
+                    record["Id"] = self._crid_index.lookup(crid)
+                    if not record["Id"]:
+                        error = f"there is no record with CRID {crid} in Salesforce"
+                if error:
+                    failures.writerow([crid or "", error, name])
+                    failed += 1
+                    continue
+                if chunk is None:
+                    chunk = open(chunk_path, "w", newline = "", encoding = "utf-8")
+                    writer = csv.writer(chunk, lineterminator = "\n")
+                    writer.writerow(columns)
+                writer.writerow([bulk_csv_value(record.get(column)) for column in columns])
+                sources.append((crid, name))
+                if len(sources) >= BULK_CHUNK_ROWS or chunk.tell() >= BULK_CHUNK_BYTES:
+                    chunk.close()
+                    failed += submit(sources)
+                    chunk, sources = None, []
+            if chunk is not None:
+                chunk.close()
+                failed += submit(sources)
+
+            processed = 0
+            for job_id, rows in jobs:
+                try:
+                    job = self._wait_for_bulk_job(job_id)
+                except Exception as e:
+                    print(f"\033[91mJob {job_id}: could not be checked: {e}\033[00m")
+                    failures.writerow(["", f"the job could not be checked ({e}); its {rows} record(s) may not have been imported, see Bulk Data Load Jobs in the Salesforce Setup", f"job {job_id}"])
+                    failed += rows
+                    continue
+                processed += job.get("numberRecordsProcessed", 0)
+                try:
+                    failed += self._write_bulk_failures(job, failures)
+                except Exception as e:
+                    print(f"\033[91mJob {job_id}: could not download the records that failed: {e}\033[00m")
+                    not_imported = job.get("numberRecordsFailed", 0) + (rows - job.get("numberRecordsProcessed", 0) if job["state"] != "JobComplete" else 0)
+                    failures.writerow(["", f"the {not_imported} record(s) of the job that were not imported could not be downloaded ({e}), see Bulk Data Load Jobs in the Salesforce Setup", f"job {job_id}"])
+                    failed += not_imported
+
+        print(f"{read} file(s) read ({superseded} superseded by a newer result of the same CRID), {processed} record(s) processed by Salesforce in {len(jobs)} job(s), {failed} failed")
+        if failed:
+            print(f"\033[93mThe records that could not be imported are listed in {self._args.failures}\033[00m")
+        return 1 if failed else 0
+
+    ########
+    # These functions handle an ingest job of Salesforce's Bulk API 2.0:
+    #   - _submit_bulk_job(): creates a job, uploads the given CSV file (of the given number of records) to it, and returns the id of the job;
+    #     if the upload fails, the job is aborted and the error raised
+    #   - _wait_for_bulk_job(): waits for the job with the given id to be done (complete, failed or aborted), and returns its information
+    #   - _write_bulk_failures(): writes the records of the given job (its information) that were not imported to the failures CSV writer,
+    #     and returns their number; records of a failed or aborted job that were not processed at all are written too
+    # NOTE: The CSV data is streamed from and to Salesforce, without being loaded in memory
+    ########
+    def _submit_bulk_job(self, path, rows):
+        job = {"object": "Equipment__c", "contentType": "CSV", "lineEnding": "LF", "operation": self._args.operation}
+        if self._args.operation == "upsert":
+            job["externalIdFieldName"] = ALL_FIELDS_API_NAMES["CRID"]
+        def upload(sf, job_id):
+            with open(path, "rb") as data:
+                sf._call_salesforce("PUT", f"{sf.base_url}jobs/ingest/{job_id}/batches", headers = {"Content-Type": "text/csv"}, data = data)
+
+        with trace_span("bulk job submit", "salesforce", records = rows) as span:
+            job_id = self._call_salesforce(lambda sf: sf.restful("jobs/ingest", method = "POST", json = job))["id"]
+            span.set(job = job_id)
+            try:
+                self._call_salesforce(lambda sf: upload(sf, job_id))
+                self._call_salesforce(lambda sf: sf.restful(f"jobs/ingest/{job_id}", method = "PATCH", json = {"state": "UploadComplete"}))
+            except Exception:
+                # the job is aborted (if Salesforce can be reached), rather than left open
+                with contextlib.suppress(Exception):
+                    self._call_salesforce(lambda sf: sf.restful(f"jobs/ingest/{job_id}", method = "PATCH", json = {"state": "Aborted"}))
+                raise
+        print(f"Job {job_id}: {rows} record(s) submitted")
+        return job_id
+
+    def _wait_for_bulk_job(self, job_id):
+        interval = BULK_POLL_INTERVAL
+        with trace_span("bulk job wait", "salesforce", job = job_id) as span:
+            while True:
+                job = self._call_salesforce(lambda sf: sf.restful(f"jobs/ingest/{job_id}"))
+                if job["state"] in ("JobComplete", "Failed", "Aborted"):
+                    span.set(state = job["state"])
+                    break
+                time.sleep(interval)
+                interval = min(interval * 2, BULK_MAX_POLL_INTERVAL)
+        message = f"Job {job_id}: {job['state']}, {job.get('numberRecordsProcessed', 0)} record(s) processed, {job.get('numberRecordsFailed', 0)} failed"
+        if job.get("errorMessage"):
+            message += f" ({job['errorMessage']})"
+        print(f"\033[92m{message}\033[00m" if job["state"] == "JobComplete" and not job.get("numberRecordsFailed") else f"\033[93m{message}\033[00m")
+        return job
+
+    def _write_bulk_failures(self, job, failures):
+        results = ["failedResults"] + (["unprocessedrecords"] if job["state"] != "JobComplete" else [])
+        csv = import_module("csv")
+        tempfile = import_module("tempfile")
+        crid = ALL_FIELDS_API_NAMES["CRID"]
+        written = 0
+        for result in results:
+            response = self._call_salesforce(lambda sf: sf._call_salesforce("GET", f"{sf.base_url}jobs/ingest/{job['id']}/{result}/", headers = {"Accept": "text/csv"}, stream = True))
+            # the results are saved to a temporary file first, since error messages in them may span several lines
+            with response, tempfile.TemporaryFile() as data:
+                for block in response.iter_content(64 * 1024):
+                    data.write(block)
+                data.seek(0)
+                for row in csv.DictReader(io.TextIOWrapper(data, encoding = "utf-8", newline = "")):
+                    error = row.get("sf__Error") or f"not processed ({job['state']})"
+                    failures.writerow([row.get(crid, ""), error, f"job {job['id']}"])
+                    written += 1
+        return written
+
+    ########
+    # This function handles the "serve" command: it runs a fleet collector (see CollectorRequestHandler) until interrupted, and returns the exit code
+    # Records received are queued in the collector's spool, which is flushed to Salesforce every --flush-interval seconds,
+    #   or as soon as a full batch is queued; the CRID index is synced before each flush, but only if there are records to upload
+    ########
+    def serve_collector(self):
+        self._background = concurrent.futures.ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "background")
+        self._login = concurrent.futures.Future()
+        self._login.set_result(self.authenticate())
+        if not self._login.result():
+            return 1
+        self._crid_index = CridIndex.load(crid_index_path(self._args.test))
+        self._crid_index_sync = self._background.submit(self._sync_CRID_index)
+
+        host, _, port = self._args.listen.rpartition(":")
+        if not os.getenv("HW_COLLECTOR_TOKEN") and not is_loopback(host):
+            print(f"\033[91mRefusing to listen on {self._args.listen} without a token, since anyone on the network could send records:"
+                " set HW_COLLECTOR_TOKEN (on the collector and on the machines), or listen on 127.0.0.1\033[00m")
+            return 1
+        http_server = import_module("http.server")
+        handler = type("CollectorRequestHandler", (CollectorRequestHandler, http_server.BaseHTTPRequestHandler), dict())
+        server = http_server.ThreadingHTTPServer((host or "0.0.0.0", int(port)), handler)
+        server.collector = self
+        server.spool = UploadSpool(collector_spool_path(self._args.test))
+        server.flush_now = threading.Event()
+
+        stop = threading.Event()
+        def flush_loop():
+            while not stop.is_set():
+                server.flush_now.wait(self._args.flush_interval)
+                server.flush_now.clear()
+                try:
+                    if not server.spool.counts().get("pending"):
+                        continue # nothing to upload, so no API call is made (lookups that miss sync the CRID index themselves)
+                    self._salesforce_http.reset_retry_budget()
+                    self._sync_CRID_index()
+                    sent = server.spool.flush(self._upsert_records)
+                    if sent:
+                        print(f"{sent} record(s) uploaded to Salesforce ({self._salesforce_http.describe_usage() or 'API usage unknown'})")
+                except Exception as e:
+                    print(f"\033[91mError occured when uploading records to Salesforce: {e}\033[00m")
+        flusher = threading.Thread(target = flush_loop, name = "flusher")
+        flusher.start()
+
+        print(f"Collector listening on {self._args.listen}; press Ctrl+C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            stop.set()
+            server.flush_now.set()
+            flusher.join()
+        return 0
+
     ########
     # This section contains all the functions that handles data input and validation for manual fields
     # NOTE: If a field is named xxx, the corresponding function MUST be named _xxx_fn
@@ -459,6 +3013,20 @@ class EquipmentInfo():
     #        but data_review() calls these functions without the integer, since there's no question number to display)
     ########
 
+    def _CRID_fn(self, i=None):
+        while True:
+            if i:
+                cr = input(f" ({i:02d}/{len(self.manual_fields):02d}) [REQUIRED] Enter CRID: ")
+            else:
+                cr = input(f" - [REQUIRED] Enter CRID: ")
+
+            if not cr:
+                print("\033[91m  CRID is required\033[00m")
+            else:
+                self.CRID = cr
+                self._start_CRID_lookup(cr)
+                break
+
     def _has_webcam_fn(self, i=None):
         while True:
             if i:
@@ -546,60 +3114,212 @@ class EquipmentInfo():
         else:
             print(f" - Enter new value for storage size (GB):")
 
-        print("  Below are a list of all mounted file systems and their size:")
         try:
-            output = subprocess.check_output("lsblk -d -o NAME,SIZE,TYPE,MOUNTPOINT | grep 'name|sda|sdb|nvme' -i -E",
-                shell = True,
-                text = True,
-                stderr = subprocess.STDOUT)
+            disks = self._get_disks()
+        except OSError:
+            print(f"\033[91m  (Unexpected error when reading /sys/block, no available information can be provided at this time)\033[00m")
+        else:
+            print("  Below are a list of all disks of this machine and their size:")
+            print("  " + "  ".join(f"{heading:<12}" for heading in DISK_TABLE_HEADINGS))
+            for disk in disks:
+                print("  " + "  ".join(f"{column:<12}" for column in disk_table_row(disk)))
+        if self.storage != None:
+            print(f"\033[93m  (total size of the disks counted: {self.storage:g} GB; press ENTER to keep it)\033[00m")
+
+        while True:
+            storage = input(f" *total storage size (GB): ")
+            if not storage:
+                break
+            try:
+                storage = float(storage)
+                self.storage = storage
+                break
+            except ValueError:
+                print("\033[91m  Please enter a valid number, or ENTER to skip\033[00m")
+
+    ########
+    # This section contains all the functions that collect auto fields
+    # NOTE: If a field is named xxx, the corresponding function MUST be named _xxx_collector
+    # NOTE: Each function runs on a worker thread, so it MUST NOT set any field on self; instead it returns a tuple (value, error),
+    #       where error is None if the field is collected successfully, or a message (str) describing what went wrong
+    ########
+
+    def _model_name_collector(self):
+        try:
+            model_name = self._read_source(os.path.join(PROC_ROOT, "cpuinfo"), read_cpu_model)
+        except OSError as e:
+            return None, f"cannot read /proc/cpuinfo ({e.strerror})"
+        if model_name is None:
+            return None, "'model name' not found (unexpected /proc/cpuinfo file format)"
+        return model_name, None
+
+    def _RAM_collector(self):
+        try:
+            ram = self._read_source(os.path.join(PROC_ROOT, "meminfo"), read_mem_total)
+        except OSError as e:
+            return None, f"cannot read /proc/meminfo ({e.strerror})"
+        except ValueError as e:
+            return None, "unexpected MemTotal format (unexpected /proc/meminfo file format)"
+        if ram is None:
+            return None, "'MemTotal' not found (unexpected /proc/meminfo file format)"
+        return ram, None
+
+    def _screen_size_collector(self):
+        try:
+            displays = self._read_source(os.path.join(SYS_ROOT, "class", "drm"), read_displays)
+        except OSError: # no /sys, fall back to `xrandr`
+            displays = []
+        for display in displays:
+            if display["width_mm"] and display["height_mm"]: # projectors and some TVs report a size of 0
+                return screen_diagonal(display["width_mm"], display["height_mm"]), None
+
+        # fallback: ask `xrandr` (needs a running X session)
+        try:
+            output = self._run_linux_commands("screen_size")
         except subprocess.CalledProcessError as e:
-            print(f"\033[91m  (Unexpected error when running Linux command, no available information can be provided at this time)\033[00m")
+            return None, e.stderr.strip() if e.stderr else "`grep` didn't find match (`xrandr` cannot find current display device)"
+        try:
+            r = re.match(r".*\s+(\d+)mm\s+x\s+(\d+)mm", output)
+            return screen_diagonal(int(r.group(1)), int(r.group(2))), None
+        except Exception as e:
+            return None, "regex matching error (unexpected output format from `xrandr`)"
+
+    def _battery_health_collector(self):
+        try:
+            batteries = self._read_source(os.path.join(SYS_ROOT, "class", "power_supply"), read_batteries)
+        except OSError: # no /sys, fall back to `upower`
+            batteries = None
         else:
-            for line in output.split("\n"):
-                if not line:
-                    continue
-                else:
-                    print(f"  {line}")
-            while True:
-                storage = input(f" *total storage size (GB): ")
-                if not storage:
-                    break
-                try:
-                    storage = float(storage)
-                    self.storage = storage
-                    break
-                except ValueError:
-                    print("\033[91m  Please enter a valid number, or ENTER to skip\033[00m")
+            if not batteries:
+                return None, "no battery found in /sys/class/power_supply"
+            health = battery_health(batteries)
+            if health is not None:
+                return health, None
+
+        # fallback: ask `upower` (through D-Bus)
+        try:
+            output = self._run_linux_commands("battery_health")
+        except subprocess.CalledProcessError as e:
+            return None, e.stderr.strip() if e.stderr else "`grep` didn't find match (battery information not found by `upower`)"
+        try:
+            r = re.match(r"([\d\.]*)%", output)
+            return round(float(r.group(1)), 2), None
+        except Exception as e:
+            return None, "regex matching error (unexpected output format from `upower`)"
+
+    def _has_ethernet_collector(self):
+        try:
+            return self._get_pci_index().has_class(PCI_CLASS_ETHERNET), None
+        except OSError: # no /sys, fall back to `lspci`
+            return self._linux_commands_match("has_ethernet"), None
+
+    def _has_wifi_collector(self):
+        try:
+            return self._get_pci_index().has_class(*PCI_CLASSES_WIFI), None
+        except OSError: # no /sys, fall back to `lspci`
+            return self._linux_commands_match("has_wifi"), None
+
+    def _has_optical_drive_collector(self):
+        found = self._read_source(os.path.join(SYS_ROOT, "block"), has_optical_drive)
+        if found is not None:
+            return found, None
+
+        # fallback: search the kernel log, first directly, then with `dmesg`
+        try:
+            return self._read_source(KERNEL_LOG, lambda: kernel_log_search(OPTICAL_DRIVE_LOG_PATTERN)), None
+        except OSError:
+            return self._linux_commands_match("has_optical_drive"), None
+
+    def _has_touchscreen_collector(self):
+        try:
+            devices = self._read_source(os.path.join(PROC_ROOT, "bus", "input", "devices"), read_input_devices)
+        except OSError: # no /proc nor /sys, fall back to `xinput` (needs a running X session)
+            return self._linux_commands_match("has_touchscreen"), None
+        return any("touchscreen" in device["kinds"] for device in devices), None
 
     ########
     # other helper functions
     ########
 
     ########
-    # This functions converts data into the correct JSON format accepted by the database schema in Salesforce
-    # NOTE: Most fields, such as those of boolean or number types, don't require extra convertion, because their values can be uploaded as is into Salesforce
-    #       However, some fields, such as multi-select, require the data to be a special format, hence MUST be converted in this function
-    #       For some other fields, we may also want to convert the data due to some requirements,
-    #         e.g. in this function we change battery health from just a number, to a number followed by a % sign, so that it's more readable in Salesforce
+    # This function returns the PCI device index (see PciIndex), scanning /sys the first time it is called
+    # It is safe to call from several collectors at the same time; the scan only happens once
+    # NOTE: Raises OSError if /sys/bus/pci is not available
+    ########
+    def _get_pci_index(self):
+        return self._read_source(os.path.join(SYS_ROOT, "bus", "pci", "devices"), PciIndex.scan)
+
+    ########
+    # This function returns the disks of this machine (see read_block_devices()), which are only read once per run; they are shared by the
+    #   command line and GUI versions, and used to fill in the storage size (see _detect_storage())
+    # NOTE: Raises OSError if /sys/block is not available
+    ########
+    def _get_disks(self):
+        return self._read_source(os.path.join(SYS_ROOT, "block", "*"), read_block_devices)
+
+    ########
+    # This function returns the total size (in GB) of the internal disks of this machine (see internal_storage_gb()), or None if it's not known
+    ########
+    def _detect_storage(self):
+        try:
+            return internal_storage_gb(self._get_disks())
+        except OSError:
+            return None
+
+    ########
+    # These functions read a source of hardware information through the cache of this run (see SourceCache), so it's only read once per run:
+    #   - _read_source(): a file (or directory) under /proc or /sys, identified by its path, and read by the native reader load (e.g. read_cpu_model)
+    #   - _run_command(): a Linux command (or pipeline), which is run with run_shell(); returns its output
+    # NOTE: Both raise the same exceptions as the reader or run_shell(), every time they're called for a source that failed
+    ########
+    def _read_source(self, path, load):
+        return self._sources.get(path, load)
+
+    def _run_command(self, command, stderr=subprocess.PIPE):
+        return self._sources.get(command, lambda: run_shell(command, stderr = stderr))
+
+    ########
+    # This function runs the pipeline of Linux commands in AUTO_FIELDS_LINUX_COMMANDS for the given field, and returns its output
+    # The first command (the one that probes the hardware, e.g. `lspci`) goes through the cache of this run, so fields that share it run it once;
+    #   the rest of the pipeline (e.g. `grep`) then filters its output (see run_filters())
+    # Error messages of the commands are not printed (collectors may run while the user is typing), but kept in the exception instead
+    # NOTE: Raises subprocess.CalledProcessError if the pipeline fails, e.g. when the last `grep` finds no match; its stderr holds the error messages
+    ########
+    def _run_linux_commands(self, field):
+        probe, *filters = AUTO_FIELDS_LINUX_COMMANDS[field]
+        if not filters:
+            return self._run_command(probe)
+        try:
+            output, errors = self._run_command(probe), ""
+        except subprocess.CalledProcessError as e: # as in a shell pipeline, only the exit status of the last command counts
+            output, errors = e.output or "", e.stderr or ""
+        try:
+            return run_filters(filters, output)
+        except subprocess.CalledProcessError as e:
+            e.stderr = errors + (e.stderr or "")
+            raise
+
+    ########
+    # This function is for boolean auto fields (has_xxx): the field is True if its Linux commands find a match, False otherwise
+    ########
+    def _linux_commands_match(self, field):
+        try:
+            self._run_linux_commands(field)
+        except subprocess.CalledProcessError as e:
+            return False
+        return True
+
+    ########
+    # This functions converts data into the correct JSON format accepted by the database schema in Salesforce (see fields_to_record())
     ########
     def _convert_to_record(self):
-        record = dict()
-        
-        for field in ALL_FIELDS_API_NAMES:
-            var = getattr(self, field)
-            if var != None:
-                if field == "video_ports": # this is a picklist (multi-select) field in Salesforce, so data should be in the format of "selection1;selection2;..."
-                    var = ";".join(var)
-                elif field == "battery_health": # add a % sign after the number for readability
-                    var = str(var) + "%"
-                record[ALL_FIELDS_API_NAMES[field]] = var
-
-        return record
+        with trace_span("_convert_to_record", "record"):
+            return fields_to_record({field: getattr(self, field) for field in ALL_FIELDS_API_NAMES})
     
     ########
     # This functions is for displaying errors that happen when running Linux commands for the automatically collected fields
     # NOTE: If a new auto field is to be added, there are no changes to be done here
-    #       However, you should make sure that any new errors that may occur for the new auto field is saved to self._errors, which is a dictionary mapping field name to the error
+    #       However, you should make sure that the collector of the new auto field returns any errors that may occur, which data_collection() saves to self._errors
     ########
     def _display_errors(self):
         if len(self._errors):
@@ -613,11 +3333,15 @@ class EquipmentInfo():
     ########
     # This function runs a simple GUI, implemented with PySimpleGUI, that is (mostly) doing the same thing as the script above
     #
+    # Looking up the CRID, collecting the auto fields and uploading run on worker threads (see in_background() below), which report back to the
+    #   event loop with window.write_event_value(), so the window never freezes, and EXIT works at any time
+    #
     # NOTE: The GUI is mostly hardcoded and not easily extendable at the moment. It is more of a proof of concept as opposed to a fully developed GUI,
     #       since there is NO validation of user inputs, nor can users modify fields like they could in the command line version
     #       To add a new field, you should manually add the new boxes into the layout, and manually turn their display on and off at the correct step
     ########
     def start_GUI(self):
+        sg = import_module("PySimpleGUI")
         step = 0
 
         # color theme of the GUI
@@ -640,34 +3364,20 @@ class EquipmentInfo():
 
         # make the texts for storage size display
         storage_boxes = [
-            [sg.pin(sg.Text("Storage (GB):", key="storage_text", size=(15,1), font=font_bold, visible=False)), sg.Input(key="storage", size=(8,1), font=font, visible=False)],
-            [sg.pin(sg.Text("(Below are a list of all mounted file systems and their size:)", key="storage_prompt", font=font_small, visible=False))]
+            [sg.pin(sg.Text("Storage (GB):", key="storage_text", size=(15,1), font=font_bold, visible=False)),
+             sg.Input(f"{self.storage:g}" if self.storage != None else "", key="storage", size=(8,1), font=font, visible=False)],
+            [sg.pin(sg.Text("(Below are a list of all disks of this machine and their size; the ones counted are added up above:)", key="storage_prompt", font=font_small, visible=False))]
         ]
-        rows = []
-        heading = []
         try:
-            output = subprocess.check_output("lsblk -d -o NAME,SIZE,TYPE,MOUNTPOINT | grep 'name|sda|sdb|nvme' -i -E",
-                shell = True,
-                text = True,
-                stderr = subprocess.STDOUT)
-        except subprocess.CalledProcessError as e:
-            pass
-        else:
-            for i, line in enumerate(output.split("\n")):
-                if not line:
-                    continue
-                elif i == 0:
-                    heading = line.split()
-                else:
-                    line = line.split()
-                    rows.append(line)
-        finally:
-            storage_boxes.append([sg.pin(sg.Table(
-                values=rows, 
-                headings=heading,
-                key="storage_table",
-                visible=False,
-            ))])
+            rows = [disk_table_row(disk) for disk in self._get_disks()]
+        except OSError:
+            rows = []
+        storage_boxes.append([sg.pin(sg.Table(
+            values=rows, 
+            headings=DISK_TABLE_HEADINGS,
+            key="storage_table",
+            visible=False,
+        ))])
 
         auto_fields_boxes = [[
             sg.pin(sg.Text(f"{field}:", key=field+"_text", size=(15,1), font=font_bold, visible=False)),
@@ -698,28 +3408,76 @@ class EquipmentInfo():
             
             # automatic data collection
             [sg.pin(sg.Text("Below shows values of all automatically collected fields:", key="prompt_auto_data", size=(60,1), font=font, visible=False))],
+            [sg.pin(sg.ProgressBar(len(self.auto_fields), orientation="h", size=(30,15), key="collection_progress", visible=False)),
+             sg.pin(sg.Text("", key="collection_progress_text", size=(25,1), font=font_small, visible=False))],
             auto_fields_boxes,
 
             # prompts for data upload
             [sg.pin(sg.Text("", key="prompt_space_2", size=(20,1), visible=False))],
-            [sg.pin(sg.Text("Click NEXT to upload data to Salesforce (may take a few seconds to load!)", key="prompt_upload", size=(60,1), font=font, visible=False))],
+            [sg.pin(sg.Text("Click NEXT to upload data to Salesforce", key="prompt_upload", size=(60,1), font=font, visible=False))],
             [sg.pin(sg.Text("Data uploaded successfully!", key="prompt_upload_success", size=(60,1), font=font, visible=False))],
             [sg.pin(sg.Text("Data upload FAILED.", key="prompt_upload_failure", size=(60,1), font=font, visible=False))],
+            [sg.pin(sg.Text("Data saved locally; it will be uploaded the next time the script runs.", key="prompt_upload_queued", size=(60,1), font=font, visible=False))],
             
             # NEXT and EXIT buttons
             [sg.Button("NEXT", font=font_small, size=(6,1)), sg.Button("EXIT", font=font_small, size=(6,1))],
         ], size=(700, 700))
+        window.finalize()
+        startup_mark("GUI window shown")
+
+        # runs function(*args) on a worker thread, and then sends the event with (result, exception) to the event loop
+        # NOTE: Nothing is sent once the window is closed (e.g. EXIT is clicked while collecting)
+        closed = threading.Event()
+        def in_background(event, function, *args):
+            def run():
+                try:
+                    result = (function(*args), None)
+                except Exception as e:
+                    result = (None, e)
+                if not closed.is_set():
+                    window.write_event_value(event, result)
+            threading.Thread(target = run, name = event, daemon = True).start()
+            window["NEXT"].update(disabled = True)
+
+        # returns the given CRID with the Salesforce id of its record (None if there is no such record, or False if logging in failed)
+        # NOTE: The CRID is returned along with the id, since the CRID input may have been edited while looking it up
+        def find_record(cr):
+            if not self._wait_for_login():
+                return cr, False
+            self._start_CRID_lookup(cr)
+            return cr, self._crid_lookup.result()
+
+        # shows each auto field as soon as it's collected
+        collected = []
+        def show_auto_field(field, val, err):
+            if not closed.is_set():
+                window.write_event_value("auto_field_collected", (field, val, err))
 
         while True:
             event, values = window.read()
             if event in (None, 'EXIT'):
+                # the record is already saved in the upload spool if EXIT is clicked while uploading, so it's uploaded the next time the script runs
+                closed.set()
+                window.close()
                 break
             # page 2: manual data entry
             if event == "NEXT" and step == 0:
+                window['status'].update("Looking up the CRID in Salesforce...")
+                window['CRID'].update(disabled = True)
+                in_background("record_found", find_record, values['CRID'])
+            elif event == "record_found":
+                window["NEXT"].update(disabled = False)
+                window['CRID'].update(disabled = False)
                 window['status'].update("")
-                cr = values['CRID']
-                try:
-                    self.eid = self.sf.Equipment__c.get_by_custom_id(ALL_FIELDS_API_NAMES["CRID"], cr)['Id']
+                found, error = values[event]
+                cr, eid = found or (values['CRID'], None)
+                if eid is False:
+                    window.close()
+                    sys.exit(1)
+                if not eid:
+                    window['status'].update(f"No record with CRID {cr} in Salesforce, please double check and reenter")
+                else:
+                    self.eid = eid
                     self.CRID = cr
                     # display CRID
                     window['CRID_text'].update(visible = False)
@@ -760,11 +3518,12 @@ class EquipmentInfo():
                     window['storage_table'].update(visible = True)
 
                     step += 1
-                except:
-                    window['status'].update(f"No record with CRID {cr} in Salesforce, please double check and reenter")
             # page 3: auto data collection
             elif event == "NEXT" and step == 1:
                 # save user inputs
+                # they are parsed like in the unattended mode (see _parse_manual_field()), so that e.g. numbers are saved as numbers, not text;
+                #   if a value is not valid, the page stays open so that it can be corrected
+                invalid = []
                 for field in self.manual_fields:
                     if field == "CRID":
                         pass
@@ -776,9 +3535,18 @@ class EquipmentInfo():
                     elif field == "final_os":
                         if values[field] != "(leave as empty)":
                             setattr(self, field, values[field])
+                    elif field == "storage" and self.storage != None and values[field] == f"{self.storage:g}":
+                        pass # the detected size was kept, and is saved as detected (the text shown is rounded)
                     else:
                         if values[field] != "":
-                            setattr(self, field, values[field])
+                            try:
+                                setattr(self, field, self._parse_manual_field(field, values[field]))
+                            except ValueError as e:
+                                invalid.append(f"{field} {e}")
+                if invalid:
+                    window['status'].update("Please correct: " + "; ".join(invalid))
+                    continue
+                window['status'].update("")
                 step += 1
 
                 # turn off display for previous input fields first
@@ -800,22 +3568,40 @@ class EquipmentInfo():
 
                 # then turn on display for auto collected data
                 window['prompt'].update("====STEP 2: AUTO DATA COLLECTION====")
-
-                # run data collection and report errors (if any)
-                self.data_collection()
-                if len(self._errors):
-                    window['status'].update(f"Error has occured on {len(self._errors)} field(s), please report terminal output to manager")
-                
                 window["prompt_auto_data"].update(visible = True)
-                window["prompt_space_2"].update(visible = True)
-                window["prompt_upload"].update(visible = True)
+                window["collection_progress"].update(current_count = 0, visible = True)
+                window["collection_progress_text"].update(f"Collecting... (0/{len(self.auto_fields)})", visible = True)
                 for field in self.auto_fields:
                     window[field+'_text'].update(visible = True)
-                    window[field].update(visible = True)
-                    if getattr(self, field) != None:
-                        window[field].update(getattr(self, field))
-                    else:
-                        window[field].update("(empty)")
+                    window[field].update("(collecting...)", visible = True)
+
+                # run data collection, displaying each field as soon as it's collected
+                in_background("collection_done", self.data_collection, show_auto_field)
+            elif event == "auto_field_collected":
+                field, val, err = values[event]
+                collected.append(field)
+                if err:
+                    window[field].update("(error)")
+                elif val != None:
+                    window[field].update(val)
+                else:
+                    window[field].update("(empty)")
+                window["collection_progress"].update(current_count = len(collected))
+                window["collection_progress_text"].update(f"Collecting... ({len(collected)}/{len(self.auto_fields)})")
+            elif event == "collection_done":
+                window["NEXT"].update(disabled = False)
+                window["collection_progress"].update(visible = False)
+                window["collection_progress_text"].update(visible = False)
+
+                # report errors (if any)
+                result, error = values[event]
+                if error:
+                    window['status'].update(f"Unexpected error when collecting data ({error}), please report terminal output to manager")
+                elif len(self._errors):
+                    window['status'].update(f"Error has occured on {len(self._errors)} field(s), please report terminal output to manager")
+
+                window["prompt_space_2"].update(visible = True)
+                window["prompt_upload"].update(visible = True)
             # page 4: display if data upload is successful
             elif event == "NEXT" and step == 2:
                 window['status'].update("")
@@ -830,14 +3616,22 @@ class EquipmentInfo():
 
                 # then turn on display for the data upload section
                 window['prompt'].update("====STEP 3: DATA UPLOAD====")
+                window['status'].update("Uploading data to Salesforce...")
 
-                # attempt to upload data and display the result
-                record = self._convert_to_record()
-                try:
-                    self.sf.Equipment__c.update(self.eid, record)
+                # attempt to upload data
+                in_background("upload_done", self.upload_record)
+            # display the result of the upload
+            elif event == "upload_done":
+                window['status'].update("")
+                result, error = values[event]
+                status, error = result if result else ("failed", error)
+                if status == "sent":
                     window["prompt_upload_success"].update(visible = True)
-                except:
-                    window['status'].update(f"Unexpected error, likely that record with CRID {self.CRID} is recently deleted from Salesforce")
+                elif status == "pending":
+                    window['status'].update(f"Salesforce cannot be reached right now ({error})")
+                    window["prompt_upload_queued"].update(visible = True)
+                else:
+                    window['status'].update(f"Salesforce did not accept the data of CRID {self.CRID} ({error})")
                     window["prompt_upload_failure"].update(visible = True)
 
                 # already on the last page, no more NEXT button
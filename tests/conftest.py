@@ -0,0 +1,172 @@
+import argparse
+import csv
+import datetime
+import email.utils
+import http.server
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import urllib.parse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import script
+
+
+CRID = script.ALL_FIELDS_API_NAMES["CRID"]
+
+
+########
+# This fixture points the cache directory of the script (spools, CRID index, sessions) to a temporary directory
+########
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(script, "CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+########
+# This class is a mock of the parts of the Salesforce REST API used by the script, keeping its records in memory:
+#   - query (the CRID index sync), sobjects/Equipment__c/<id> (fetching a record)
+#   - composite (updates guarded by If-Unmodified-Since), composite/sobjects (sObject Collections updates and upserts by CRID)
+#   - jobs/ingest (Bulk API 2.0 ingest jobs)
+# Tests set up self.records (record id -> field values, including SystemModstamp), and check self.requests (method, path) and self.jobs
+# Setting self.fail_next to n makes the next n requests answer 503, whatever they are
+########
+class MockSalesforce():
+    def __init__(self):
+        self.records = dict()
+        self.requests = []
+        self.jobs = dict()               # job id -> {"job": the job as created, "rows": the CSV rows uploaded, "state": ...}
+        self.fail_next = 0
+        self.fail_uploads = set()        # ids of the jobs whose CSV upload fails
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        mock = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            def do_GET(self):
+                mock._handle(self)
+            do_POST = do_PATCH = do_PUT = do_GET
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def add_record(self, eid, crid, modstamp="2023-01-01T00:00:00.000+0000", **fields):
+        self.records[eid] = dict(fields, **{CRID: crid, "SystemModstamp": modstamp})
+
+    def _handle(self, request):
+        url = urllib.parse.urlsplit(request.path)
+        path = url.path.split("/", 4)[-1] if url.path.startswith("/services/data/") else url.path
+        body = request.rfile.read(int(request.headers.get("Content-Length") or 0))
+        with self._lock:
+            self.requests.append((request.command, path))
+            if self.fail_next:
+                self.fail_next -= 1
+                return self._reply(request, 503, [{"errorCode": "SERVER_UNAVAILABLE", "message": "try again"}])
+            return self._route(request, request.command, path, urllib.parse.parse_qs(url.query), body)
+
+    def _route(self, request, method, path, query, body):
+        if path == "query/" or path == "queryAll/":
+            records = [{"Id": eid, CRID: record[CRID], "SystemModstamp": record["SystemModstamp"], "IsDeleted": False}
+                       for eid, record in self.records.items()]
+            return self._reply(request, 200, {"totalSize": len(records), "done": True, "records": records})
+        if path.startswith("sobjects/Equipment__c/") and method == "GET":
+            record = self.records[path.rsplit("/", 1)[1]]
+            return self._reply(request, 200, {name: record.get(name) for name in query["fields"][0].split(",")})
+        if path == "composite" and method == "POST":
+            return self._reply(request, 200, {"compositeResponse": [self._guarded_update(sub) for sub in json.loads(body)["compositeRequest"]]})
+        if path == "composite/sobjects" and method == "PATCH":
+            results = []
+            for record in json.loads(body)["records"]:
+                self._update(record["id"], {name: value for name, value in record.items() if name not in ("id", "attributes")})
+                results.append({"id": record["id"], "success": True, "errors": []})
+            return self._reply(request, 200, results)
+        if path == f"composite/sobjects/Equipment__c/{CRID}" and method == "PATCH":
+            results = []
+            for record in json.loads(body)["records"]:
+                eid = next((eid for eid, current in self.records.items() if current[CRID] == record[CRID]), None)
+                if eid is None:
+                    eid = f"new{len(self.records)}"
+                    self.add_record(eid, record[CRID])
+                self._update(eid, {name: value for name, value in record.items() if name != "attributes"})
+                results.append({"id": eid, "success": True, "errors": []})
+            return self._reply(request, 200, results)
+        if path.startswith("jobs/ingest"):
+            return self._bulk(request, method, path.split("/")[2:], body)
+        return self._reply(request, 404, [{"errorCode": "NOT_FOUND", "message": path}])
+
+    def _guarded_update(self, sub):
+        eid = sub["url"].rsplit("/", 1)[1]
+        since = email.utils.parsedate_to_datetime(sub["httpHeaders"]["If-Unmodified-Since"])
+        modstamp = datetime.datetime.strptime(self.records[eid]["SystemModstamp"], "%Y-%m-%dT%H:%M:%S.%f%z")
+        if modstamp > since:
+            return {"body": [{"errorCode": "PRECONDITION_FAILED", "message": "modified"}], "httpStatusCode": 412, "referenceId": sub["referenceId"]}
+        self._update(eid, sub["body"])
+        return {"body": None, "httpStatusCode": 204, "referenceId": sub["referenceId"]}
+
+    def _update(self, eid, values):
+        self.records[eid].update(values)
+        self.records[eid]["SystemModstamp"] = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0000"
+
+    def _bulk(self, request, method, parts, body):
+        if not parts and method == "POST":
+            job_id = f"750{next(self._job_ids)}"
+            self.jobs[job_id] = {"job": json.loads(body), "rows": [], "state": "Open"}
+            return self._reply(request, 200, {"id": job_id, "state": "Open"})
+        job_id, job = parts[0], self.jobs[parts[0]]
+        if parts[1:] == ["batches"] and method == "PUT":
+            if job_id in self.fail_uploads:
+                return self._reply(request, 400, [{"errorCode": "INVALIDJOBSTATE", "message": "upload failed"}])
+            job["rows"] = list(csv.DictReader(io.StringIO(body.decode())))
+            return self._reply(request, 201, "")
+        if len(parts) == 1 and method == "PATCH":
+            job["state"] = "JobComplete" if json.loads(body)["state"] == "UploadComplete" else json.loads(body)["state"]
+            return self._reply(request, 200, {"id": job_id, "state": job["state"]})
+        if len(parts) == 1 and method == "GET":
+            return self._reply(request, 200, {"id": job_id, "state": job["state"], "numberRecordsProcessed": len(job["rows"]), "numberRecordsFailed": 0})
+        if parts[1] in ("failedResults", "unprocessedrecords"):
+            return self._reply(request, 200, "sf__Id,sf__Error\n", "text/csv")
+        return self._reply(request, 404, [{"errorCode": "NOT_FOUND", "message": "/".join(parts)}])
+
+    def _reply(self, request, status, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+
+########
+# This fixture starts a mock Salesforce (see MockSalesforce) and makes the script use it instead of the real one
+########
+@pytest.fixture
+def salesforce(monkeypatch, cache_dir):
+    mock = MockSalesforce()
+    monkeypatch.setenv("SF_BENCH_INSTANCE_URL", mock.url)
+    monkeypatch.setenv("SF_BENCH_SESSION_ID", "session")
+    monkeypatch.setattr(script, "SALESFORCE_RETRY_DELAY", 0)
+    yield mock
+    mock.server.shutdown()
+    mock.server.server_close()
+
+
+########
+# This function builds an EquipmentInfo with the given command line arguments, without parsing them or running the audit
+########
+def equipment_info(**args):
+    info = script.EquipmentInfo.__new__(script.EquipmentInfo)
+    info.reset_fields()
+    info._args = argparse.Namespace(**dict({"test": False, "collector": None}, **args))
+    info.sf = None
+    info._salesforce_http = None
+    info._crid_index = script.CridIndex()
+    return info
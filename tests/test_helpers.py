@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+import script
+from conftest import CRID, equipment_info
+
+
+def test_record_changes_compares_like_salesforce():
+    current = {"USB__c": 3.0, "Video__c": "VGA;HDMI", "Webcam_present__c": False, "Adapter_Watts__c": None, "OS__c": "Ubuntu"}
+    record = {"USB__c": 3, "Video__c": "HDMI;VGA", "Webcam_present__c": False, "Adapter_Watts__c": "", "OS__c": "Xubuntu"}
+    assert script.record_changes(record, current) == {"OS__c": "Xubuntu"}
+
+def test_record_changes_keeps_new_and_changed_fields():
+    assert script.record_changes({"USB__c": 4, "Storage__c": 256.0}, {"USB__c": 3.0}) == {"USB__c": 4, "Storage__c": 256.0}
+    assert script.record_changes({"Webcam_present__c": True}, {"Webcam_present__c": False}) == {"Webcam_present__c": True}
+
+def test_http_date_rounds_up_to_the_next_second():
+    assert script.http_date("2023-01-31T12:00:00.500+0000") == "Tue, 31 Jan 2023 12:00:01 GMT"
+    assert script.http_date("2023-01-31T12:00:00.000+0000") == "Tue, 31 Jan 2023 12:00:00 GMT"
+
+def test_salesforce_timestamp():
+    assert script.salesforce_timestamp("2023-01-31T12:00:00.000+0000") == "2023-01-31T12:00:00Z"
+
+
+def test_battery_health_combines_batteries():
+    batteries = [{"full": 40, "design": 50, "unit": "uWh"}, {"full": 30, "design": 50, "unit": "uWh"}]
+    assert script.battery_health(batteries) == 70.0
+
+def test_battery_health_averages_batteries_in_different_units():
+    batteries = [{"full": 40000000, "design": 50000000, "unit": "uWh"}, {"full": 3000, "design": 4000, "unit": "uAh"}]
+    assert script.battery_health(batteries) == 77.5
+
+def test_battery_health_without_capacity():
+    assert script.battery_health([{"full": None, "design": 50, "unit": "uWh"}]) is None
+
+
+@pytest.mark.parametrize("value, expected", [(3, 3), (3.0, 3), ("3", 3), ("03", 3), (0, 0), (99, 99)])
+def test_usb_ports_accepts_whole_numbers(value, expected):
+    assert equipment_info()._parse_manual_field("num_usb_ports", value) == expected
+
+@pytest.mark.parametrize("value", [3.7, " 3 ", "3.0", True, None, -1, 100, "x"])
+def test_usb_ports_rejects_other_values(value):
+    with pytest.raises(ValueError):
+        equipment_info()._parse_manual_field("num_usb_ports", value)
+
+
+def test_source_cache_loads_each_source_once():
+    cache = script.SourceCache()
+    calls = []
+    assert cache.get("k", lambda: calls.append(1) or 42) == 42
+    assert cache.get("k", lambda: calls.append(1) or 43) == 42
+    assert calls == [1]
+
+def test_source_cache_caches_errors():
+    cache = script.SourceCache()
+    def fail():
+        raise OSError("missing")
+    for _ in range(2):
+        with pytest.raises(OSError):
+            cache.get("k", fail)
+    assert cache.get("other", lambda: 1) == 1
+
+def test_source_cache_loads_again_after_an_interrupted_load():
+    cache = script.SourceCache()
+    def slow_interrupted():
+        time.sleep(0.2)
+        raise KeyboardInterrupt
+    def first():
+        with pytest.raises(KeyboardInterrupt):
+            cache.get("k", slow_interrupted)
+    thread = threading.Thread(target = first)
+    thread.start()
+    time.sleep(0.05)
+    assert cache.get("k", lambda: "reloaded") == "reloaded" # waited for the interrupted load, then loaded it again
+    thread.join()
+    assert cache.get("k", lambda: "again") == "reloaded"
+
+
+def index_records(*records):
+    return [{"Id": eid, CRID: crid, "SystemModstamp": modstamp, "IsDeleted": deleted} for eid, crid, modstamp, deleted in records]
+
+def test_crid_index_sync_handles_renames_and_deletes(tmp_path):
+    index = script.CridIndex()
+    queries = []
+    def query(records):
+        return lambda soql, include_deleted: queries.append((soql, include_deleted)) or records
+
+    index.sync(query(index_records(("a1", "CR1", "2023-01-01T00:00:00.000+0000", False), ("a2", "CR2", "2023-01-02T00:00:00.000+0000", False))))
+    assert index.lookup("CR1") == "a1" and index.lookup("CR2") == "a2"
+    assert index.synced_at == "2023-01-02T00:00:00Z"
+    assert queries[-1][1] is False
+
+    # a1 renamed to CR9, a2 deleted
+    index.sync(query(index_records(("a1", "CR9", "2023-01-03T00:00:00.000+0000", False), ("a2", "CR2", "2023-01-04T00:00:00.000+0000", True))))
+    assert "SystemModstamp >= 2023-01-02T00:00:00Z" in queries[-1][0] and queries[-1][1] is True
+    assert index.lookup("CR1") is None and index.lookup("CR2") is None
+    assert index.lookup("CR9") == "a1"
+    assert index.search("CR") == ["CR9"]
+
+    path = str(tmp_path / "index")
+    index.save(path)
+    loaded = script.CridIndex.load(path)
+    assert loaded.lookup("CR9") == "a1" and loaded.synced_at == index.synced_at and len(loaded) == 1
+
+
+def sent(results):
+    return lambda records: [results] * len(records)
+
+def test_upload_spool_supersedes_pending_records(cache_dir):
+    spool = script.UploadSpool(str(cache_dir / "spool.sqlite"))
+    spool.add("CR1", "a1", {"USB__c": 1})
+    newer = spool.add("CR1", "a1", {"USB__c": 2})
+    batches = []
+    assert spool.flush(lambda records: batches.append(records) or [{"success": True}] * len(records)) == 1
+    assert [payload for record_id, payload, modstamp in batches[0]] == [{"USB__c": 2}]
+    assert spool.get(newer)["status"] == "sent"
+    assert spool.counts() == {"sent": 1, "superseded": 1}
+
+def test_upload_spool_backs_off_unless_forced(cache_dir):
+    spool = script.UploadSpool(str(cache_dir / "spool.sqlite"))
+    spool_id = spool.add("CR1", "a1", {"USB__c": 1})
+    def down(records):
+        raise OSError("network is down")
+    assert spool.flush(down) == 0
+    assert spool.get(spool_id)["attempts"] == 1 and spool.get(spool_id)["next_attempt_at"] > time.time()
+
+    # not due yet: a normal flush doesn't send it, a forced one (the flush command) does
+    assert spool.flush(sent({"success": True})) == 0
+    assert spool.flush(sent({"success": True}), force = True) == 1
+    assert spool.get(spool_id)["status"] == "sent"
+
+def test_upload_spool_retries_records_marked_for_retry(cache_dir):
+    spool = script.UploadSpool(str(cache_dir / "spool.sqlite"))
+    spool_id = spool.add("CR1", "a1", {"USB__c": 1})
+    assert spool.flush(sent({"success": False, "retry": True, "errors": [{"message": "read timed out"}]})) == 0
+    row = spool.get(spool_id)
+    assert row["status"] == "pending" and row["last_error"] == "read timed out"
+
+    assert spool.flush(sent({"success": False, "errors": [{"message": "bad value"}]}), force = True) == 0
+    assert spool.get(spool_id)["status"] == "failed"
+
+def test_upload_spool_gives_up_after_max_attempts(cache_dir, monkeypatch):
+    monkeypatch.setattr(script, "SPOOL_MAX_ATTEMPTS", 2)
+    spool = script.UploadSpool(str(cache_dir / "spool.sqlite"))
+    spool_id = spool.add("CR1", "a1", {"USB__c": 1})
+    def down(records):
+        raise OSError("network is down")
+    spool.flush(down, force = True)
+    spool.flush(down, force = True)
+    assert spool.get(spool_id)["status"] == "failed"
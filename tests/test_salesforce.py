@@ -0,0 +1,192 @@
+import concurrent.futures
+import csv
+import http.client
+import http.server
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import script
+from conftest import CRID, equipment_info
+
+
+########
+# This function builds an EquipmentInfo connected to the mock Salesforce, with the given command line arguments
+########
+def logged_in(**args):
+    info = equipment_info(**args)
+    info._connect()
+    info._login = concurrent.futures.Future()
+    info._login.set_result(True)
+    return info
+
+
+def test_idempotent_requests_are_retried(salesforce):
+    salesforce.add_record("a01", "CR1")
+    salesforce.fail_next = 1
+    info = logged_in()
+    assert info._call_salesforce(lambda sf: sf.restful("sobjects/Equipment__c/a01", params = {"fields": CRID}))[CRID] == "CR1"
+    assert [method for method, path in salesforce.requests] == ["GET", "GET"]
+    assert info._salesforce_http.retries_left == script.SALESFORCE_RETRY_BUDGET - 1
+
+def test_updates_are_not_retried(salesforce):
+    salesforce.add_record("a01", "CR1")
+    salesforce.fail_next = 1
+    info = logged_in()
+    body = {"allOrNone": False, "records": [{"attributes": {"type": "Equipment__c"}, "id": "a01", "USB__c": 4}]}
+    with pytest.raises(Exception):
+        info._call_salesforce(lambda sf: sf.restful("composite/sobjects", method = "PATCH", json = body))
+    assert salesforce.requests == [("PATCH", "composite/sobjects")]
+    assert "USB__c" not in salesforce.records["a01"]
+
+
+def test_update_records_guarded_and_unguarded(salesforce):
+    salesforce.add_record("a01", "CR1", USB__c = 2.0)
+    salesforce.add_record("a02", "CR2", USB__c = 2.0)
+    info = logged_in()
+    results = info._update_records([
+        ("a01", {"USB__c": 3}, "2023-01-01T00:00:00.000+0000"),   # guarded: composite API
+        ("a02", {"USB__c": 5}, None),                              # unguarded: sObject Collections API
+        ("a03", {}, None),                                         # nothing changed: not sent
+    ])
+    assert [result["success"] for result in results] == [True, True, True]
+    assert salesforce.records["a01"]["USB__c"] == 3 and salesforce.records["a02"]["USB__c"] == 5
+    assert [request for request in salesforce.requests] == [("POST", "composite"), ("PATCH", "composite/sobjects")]
+
+def test_update_records_modified_since_read(salesforce):
+    salesforce.add_record("a01", "CR1", modstamp = "2030-01-01T00:00:00.000+0000", USB__c = 9.0)
+    info = logged_in()
+    [result] = info._update_records([("a01", {"USB__c": 3}, "2023-01-01T00:00:00.000+0000")])
+    assert not result["success"] and "modified in Salesforce" in result["errors"][0]["message"]
+    assert salesforce.records["a01"]["USB__c"] == 9.0
+
+def test_update_records_already_applied(salesforce):
+    # e.g. an earlier attempt was applied, but its answer was lost: the record now has our values, and a newer modstamp
+    salesforce.add_record("a01", "CR1", modstamp = "2030-01-01T00:00:00.000+0000", USB__c = 3.0)
+    info = logged_in()
+    assert info._update_records([("a01", {"USB__c": 3}, "2023-01-01T00:00:00.000+0000")]) == [{"success": True}]
+
+def test_update_records_failed_request_is_retried_later(salesforce):
+    salesforce.add_record("a01", "CR1")
+    salesforce.fail_next = 1
+    info = logged_in()
+    [result] = info._update_records([("a01", {"USB__c": 3}, "2023-01-01T00:00:00.000+0000")])
+    assert result["retry"] and not result["success"]
+
+
+def test_crid_index_sync(salesforce):
+    salesforce.add_record("a01", "CR1")
+    info = logged_in()
+    assert info._sync_CRID_index()
+    assert info._crid_index.lookup("CR1") == "a01"
+
+
+def test_import_keeps_the_newest_result_of_each_crid(salesforce, tmp_path, monkeypatch):
+    monkeypatch.setattr(script, "BULK_POLL_INTERVAL", 0)
+    results = tmp_path / "results"
+    results.mkdir()
+    for name, crid, usb, mtime in [("a.json", "CR1", 1, 100), ("b.json", "CR1", 2, 300), ("c.json", "CR1", 3, 200), ("d.json", "CR2", 4, 100)]:
+        (results / name).write_text(json.dumps({"fields": {"CRID": crid, "num_usb_ports": usb}}))
+        os.utime(results / name, (mtime, mtime))
+    (results / "broken.json").write_text("not json")
+
+    failures = tmp_path / "failures.csv"
+    info = equipment_info(operation = "upsert", failures = str(failures), directory = str(results))
+    assert info.import_records() == 1 # the broken file is a failure
+
+    [job] = salesforce.jobs.values()
+    assert job["job"]["operation"] == "upsert" and job["job"]["externalIdFieldName"] == CRID
+    assert sorted((row[CRID], row[script.ALL_FIELDS_API_NAMES["num_usb_ports"]]) for row in job["rows"]) == [("CR1", "2"), ("CR2", "4")]
+    with open(failures) as f:
+        assert [row["source"] for row in csv.DictReader(f)] == ["broken.json"]
+
+def test_import_carries_on_when_a_job_fails(salesforce, tmp_path, monkeypatch):
+    monkeypatch.setattr(script, "BULK_POLL_INTERVAL", 0)
+    monkeypatch.setattr(script, "BULK_CHUNK_ROWS", 2)
+    salesforce.fail_uploads.add("7501")
+    results = tmp_path / "results"
+    results.mkdir()
+    for i in range(4):
+        (results / f"{i}.json").write_text(json.dumps({"fields": {"CRID": f"CR{i}"}}))
+
+    failures = tmp_path / "failures.csv"
+    info = equipment_info(operation = "upsert", failures = str(failures), directory = str(results))
+    assert info.import_records() == 1
+
+    assert salesforce.jobs["7501"]["state"] == "Aborted"
+    assert len(salesforce.jobs["7502"]["rows"]) == 2 and salesforce.jobs["7502"]["state"] == "JobComplete"
+    with open(failures) as f:
+        failed = list(csv.DictReader(f))
+    assert len(failed) == 2 and all("not submitted" in row["error"] for row in failed)
+
+
+########
+# This fixture runs a collector's HTTP server (as serve_collector() does) for a collector whose CRID index has CR1, and returns the server
+# The collector object records how many times the index is synced
+########
+@pytest.fixture
+def collector(cache_dir):
+    class Collector():
+        syncs = 0
+        _crid_index = script.CridIndex({"CR1": "a01"})
+        def _sync_CRID_index(self):
+            self.syncs += 1
+            return True
+    handler = type("CollectorRequestHandler", (script.CollectorRequestHandler, http.server.BaseHTTPRequestHandler), {"log_message": lambda *args: None})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.collector = Collector()
+    server.spool = script.UploadSpool(script.collector_spool_path(False))
+    server.flush_now = threading.Event()
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def collector_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def test_collector_accepts_only_known_crids(collector):
+    status, results = script.collector_request(collector_url(collector), "POST", "/records", [{CRID: "CR1", "USB__c": 3}, {CRID: "EVIL1"}, {"USB__c": 1}])
+    assert status == 200
+    assert [result["success"] for result in results] == [True, False, False]
+    assert "no record with CRID EVIL1" in results[1]["errors"][0]["message"]
+    assert collector.collector.syncs == 1 # synced once for the unknown CRID
+    assert collector.spool.counts() == {"pending": 1}
+
+def test_collector_rejects_invalid_bodies(collector):
+    def post(data, headers={}):
+        request = urllib.request.Request(collector_url(collector) + "/records", data = data, method = "POST", headers = headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    assert post(b"not json") == 400
+    assert post(b"\xff\xfe") == 400
+    assert post(b"[]", {"Content-Length": "abc"}) == 400
+
+    # a body too large is refused as soon as its length is known, without reading it
+    connection = http.client.HTTPConnection("127.0.0.1", collector.server_address[1])
+    connection.putrequest("POST", "/records")
+    connection.putheader("Content-Length", str(script.COLLECTOR_MAX_BODY + 1))
+    connection.endheaders()
+    assert connection.getresponse().status == 413
+    connection.close()
+    assert collector.spool.counts() == {}
+
+def test_collector_requires_the_token(collector, monkeypatch):
+    monkeypatch.setenv("HW_COLLECTOR_TOKEN", "secret")
+    status, _ = script.collector_request(collector_url(collector), "GET", "/status")
+    assert status == 200
+    request = urllib.request.Request(collector_url(collector) + "/status")
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(request)
+    assert e.value.code == 401
+
+@pytest.mark.parametrize("host, loopback", [("127.0.0.1", True), ("localhost", True), ("::1", True), ("0.0.0.0", False), ("", False), ("bench.lan", False)])
+def test_is_loopback(host, loopback):
+    assert script.is_loopback(host) == loopback